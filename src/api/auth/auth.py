@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, timezone
+import time
 
 from fastapi import Depends, status, HTTPException
 from jwt import InvalidTokenError
@@ -14,6 +15,50 @@ from db.user_repository import UserRepository
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+class PrincipalCache:
+    '''
+    Users resolved from token subjects, kept for `ttl` seconds so polling endpoints and
+    websocket handshakes do not load the user on every request.
+    Entries are dropped when the user is changed or deleted (see routers/users.py),
+    on other API processes the TTL bounds how long a stale entry can live.
+    '''
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries = {}  # username -> (expires_at, user)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str):
+        entry = self.entries.get(username)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(username, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, username: str, user):
+        if self.ttl > 0:
+            self.entries[username] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, username: str):
+        self.entries.pop(username, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+principal_cache = PrincipalCache(settings.principal_cache_ttl)
+
+
 
 async def authenticate_user(username: str, password: str):
     user = await UserRepository.get_db_user(username)
@@ -21,7 +66,7 @@ async def authenticate_user(username: str, password: str):
     if not user:
         return False
 
-    if not UserRepository.verify_password(password, user.hashed_password):
+    if not await UserRepository.verify_password(password, user.hashed_password):
         return False
 
     return user
@@ -50,9 +95,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
+    if (user := principal_cache.get(token_data.username)) is not None:
+        return user
     user = await UserRepository.get_user_by_username(token_data.username)
     if user is None:
         raise credentials_exception
+    principal_cache.put(token_data.username, user)
     return user
 
 
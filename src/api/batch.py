@@ -0,0 +1,148 @@
+'''
+Headless batch runner for offline scenarios, no API, DB or pipes involved.
+
+    python batch.py jobs.json --workers 8
+
+jobs.json is a list of jobs:
+[
+    {
+        "scenario": {"id": 1, "steps": 1000, "map": {"id": 1, "layout": "SSS"}, "status": null,
+                     "vehicles": [{"id": 1, "init_x": 25, "init_y": 0, "init_speed": 0, "assigned_user_id": 1}, ...]},
+        "moves": {"<vehicle_id>": [{"steps": 50, "steering": 0.0, "acceleration": 0.3}, ...], ...}
+    },
+    ...
+]
+Every job runs the whole move script of every vehicle in one OfflineWorker engine (vehicles whose
+script ended stand still) until the scripts are exhausted or the scenario finishes.
+Logs are written as usual to the logs dir, with prefix "batch_<job index>_".
+'''
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+
+def drop_steps(moves, steps):
+    '''
+    Remove first `steps` steps from a run-length move script
+    '''
+    rest = []
+    for move in moves:
+        if steps >= move["steps"]:
+            steps -= move["steps"]
+            continue
+        rest.append({**move, "steps": move["steps"] - steps})
+        steps = 0
+    return rest
+
+
+def run_job(index: int, job: dict, chunk_steps: int = 0):
+    from settings import settings
+    from schemas.results import Scenario as SScenario
+    from sim.workers.offline_worker import OfflineWorker
+
+    settings.log_fsync = False  # logs are flushed in bulk, durability is not needed for a replay
+
+    scenario = SScenario(**job["scenario"])
+    scripts = {int(vid): moves for vid, moves in job["moves"].items()}
+
+    worker = OfflineWorker(scenario)
+    worker.logger.prefix = f"batch_{index}_"
+    worker.logger.chunk_steps = chunk_steps or scenario.steps + 1  # 0 => one write at the end
+
+    start = time.perf_counter()
+    worker.setup_env()
+    worker.setup_vehicle()
+    setup = time.perf_counter() - start
+
+    status, steps = "ACTIVE", 0
+    while status == "ACTIVE" and any(scripts.values()):
+        horizon = max(sum(m["steps"] for m in moves) for moves in scripts.values())
+        data = {
+            "steps": horizon,
+            "moves": [{"scenario_id": scenario.id, "vehicle_id": vid, "moves": moves}
+                      for vid, moves in scripts.items() if moves],
+        }
+
+        before = worker.current_step
+        response, active = worker.process_move(data)  # stops early when a vehicle is done
+        executed = worker.current_step - before
+        if executed < horizon:  # the step that ended the turn is not counted by the worker
+            executed += 1
+        steps += executed
+        status = response.get("status", "ACTIVE") if active else "FINISHED"
+        terminated = response.get("tm_info") or {}
+        scripts = {vid: drop_steps(moves, executed) for vid, moves in scripts.items() if vid not in terminated}
+
+    if status == "ACTIVE":  # scripts exhausted before the scenario finished
+        worker.logger.save()
+        worker.env.close()
+
+    return {
+        "job": index,
+        "scenario_id": scenario.id,
+        "status": status,
+        "steps": steps,
+        "setup_s": setup,
+        "run_s": time.perf_counter() - start - setup,
+        "pid": os.getpid(),
+    }
+
+
+def report(results, wall):
+    per_core = {}
+    for res in results:
+        core = per_core.setdefault(res["pid"], {"steps": 0, "run_s": 0.0, "jobs": 0})
+        core["steps"] += res["steps"]
+        core["run_s"] += res["run_s"]
+        core["jobs"] += 1
+
+    total_steps = sum(res["steps"] for res in results)
+    return {
+        "jobs": len(results),
+        "steps": total_steps,
+        "wall_s": wall,
+        "steps_per_s": total_steps / wall if wall else 0.0,
+        "per_core": [{"pid": pid, **core, "steps_per_s": core["steps"] / core["run_s"] if core["run_s"] else 0.0}
+                     for pid, core in per_core.items()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run offline scenarios with recorded move scripts")
+    parser.add_argument("jobs", help="JSON file with the list of jobs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="engine processes")
+    parser.add_argument("--chunk-steps", type=int, default=0, help="log flush interval, 0 = once per job")
+    parser.add_argument("--report", help="write the report JSON here")
+    args = parser.parse_args()
+
+    with open(args.jobs, "r") as f:
+        jobs = json.load(f)
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(run_job, ind, job, args.chunk_steps) for ind, job in enumerate(jobs)]
+        for future in as_completed(futures):
+            try:
+                res = future.result()
+            except Exception:
+                logging.exception("Batch job failed")
+                continue
+            results.append(res)
+            logging.info(f"Job {res['job']}: {res['status']} after {res['steps']} steps "
+                         f"({res['steps'] / res['run_s'] if res['run_s'] else 0:.1f} steps/s)")
+
+    summary = report(results, time.perf_counter() - start)
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary, "results": sorted(results, key=lambda r: r["job"])}, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import uuid
+
+import aio_pika
+
+from broker.base import Broker, BrokerError, encode, decode
+from settings import settings
+
+
+class AmqpBroker(Broker):
+    '''
+    RabbitMQ transport (aio-pika).
+        publish - fanout exchange, every node has its own exclusive queue bound to it
+        send    - default exchange to queue "node.<node_id>", reply through a callback queue
+    '''
+
+    BROADCAST_EXCHANGE = "scenario.broadcast"
+
+    def __init__(self, node_id: str):
+        super().__init__(node_id)
+        self.connection = None
+        self.channel = None
+        self.exchange = None
+        self.callback_queue = None
+        self.futures = {}
+        self.requests = set()  # handlers of received requests, running outside the consumer
+
+    def node_queue(self, node_id):
+        return f"node.{node_id}"
+
+    async def start(self):
+        self.connection = await aio_pika.connect_robust(host=settings.rq_host, port=settings.rq_port)
+        self.channel = await self.connection.channel()
+
+        self.exchange = await self.channel.declare_exchange(self.BROADCAST_EXCHANGE, aio_pika.ExchangeType.FANOUT)
+        broadcasts = await self.channel.declare_queue(exclusive=True)
+        await broadcasts.bind(self.exchange)
+        await broadcasts.consume(self.on_broadcast)
+
+        requests = await self.channel.declare_queue(self.node_queue(self.node_id), exclusive=True)
+        await requests.consume(self.on_request)
+
+        self.callback_queue = await self.channel.declare_queue(exclusive=True)
+        await self.callback_queue.consume(self.on_reply, no_ack=True)
+
+    async def close(self):
+        for future in self.futures.values():
+            future.cancel()
+        for task in self.requests:
+            task.cancel()
+        if self.connection:
+            await self.connection.close()
+
+    async def on_broadcast(self, message: aio_pika.abc.AbstractIncomingMessage):
+        async with message.process():
+            if message.app_id != self.node_id:
+                await self.dispatch(message.body)
+
+    async def on_request(self, message: aio_pika.abc.AbstractIncomingMessage):
+        # handlers may run a whole turn simulation, do not keep the delivery unacked meanwhile
+        await message.ack()
+        task = asyncio.create_task(self.reply(message))
+        self.requests.add(task)
+        task.add_done_callback(self.requests.discard)
+
+    async def reply(self, message: aio_pika.abc.AbstractIncomingMessage):
+        try:
+            reply = await self.dispatch(message.body)
+        except Exception:  # the sender gets a timeout, as with a rejected request
+            logging.exception(f"Node {self.node_id} failed to handle a request")
+            return
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(body=reply, correlation_id=message.correlation_id),
+            routing_key=message.reply_to,
+        )
+
+    async def on_reply(self, message: aio_pika.abc.AbstractIncomingMessage):
+        future = self.futures.pop(message.correlation_id, None)
+        if future and not future.done():
+            future.set_result(decode(message.body)["reply"])
+
+    async def publish(self, message: dict):
+        await self.exchange.publish(aio_pika.Message(body=encode(message), app_id=self.node_id), routing_key="")
+
+    async def send(self, node_id: str, message: dict):
+        correlation_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
+        self.futures[correlation_id] = future
+
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(body=encode(message),
+                                 correlation_id=correlation_id,
+                                 reply_to=self.callback_queue.name,
+                                 expiration=settings.broker_timeout),
+                routing_key=self.node_queue(node_id),
+                mandatory=True,  # no queue of the node => returned instead of silently dropped
+            )
+            return await asyncio.wait_for(future, settings.broker_timeout)
+        except aio_pika.exceptions.DeliveryError:
+            raise BrokerError(f"Node {node_id} is not reachable")
+        except asyncio.TimeoutError:
+            raise BrokerError(f"Node {node_id} did not reply in {settings.broker_timeout}s")
+        finally:
+            self.futures.pop(correlation_id, None)
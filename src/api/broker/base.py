@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+
+import orjson
+
+from sim.logger import to_serializable
+
+
+class BrokerError(Exception):
+    pass
+
+
+def encode(message: dict) -> bytes:
+    return orjson.dumps(message,
+                        default=to_serializable,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def decode(body: bytes) -> dict:
+    return orjson.loads(body)
+
+
+class Broker(ABC):
+    '''
+    Messaging between API processes (nodes).
+        publish - fire and forget message to all other nodes
+        send    - request to one node, returns its reply
+    Incoming messages of both kinds are passed to the handler set with on_message,
+    the value returned by the handler is the reply of send.
+    Messages are JSON dicts, whatever the transport.
+    '''
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.handler = None
+
+    def on_message(self, handler):
+        self.handler = handler
+
+    async def dispatch(self, body: bytes):
+        message = decode(body)
+        reply = await self.handler(message) if self.handler else None
+        return encode({"reply": reply})
+
+    @abstractmethod
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, message: dict):
+        pass
+
+    @abstractmethod
+    async def send(self, node_id: str, message: dict):
+        pass
+
+
+def create_broker(kind: str, node_id: str) -> Broker:
+    if kind == "memory":
+        from broker.memory import InMemoryBroker
+        return InMemoryBroker(node_id)
+    if kind == "amqp":
+        from broker.amqp import AmqpBroker
+        return AmqpBroker(node_id)
+    raise ValueError(f"Unknown broker {kind}")
@@ -0,0 +1,34 @@
+import asyncio
+
+from broker.base import Broker, BrokerError, encode, decode
+
+
+class InMemoryBroker(Broker):
+    '''
+    In-process stand-in for a real broker: every instance is a node and nodes of one
+    process reach each other directly. Messages are still encoded, so handlers
+    see exactly what they would get over the network.
+    Used by single process deployments and tests.
+    '''
+
+    nodes = {}  # node_id -> InMemoryBroker
+
+    async def start(self):
+        InMemoryBroker.nodes[self.node_id] = self
+
+    async def close(self):
+        InMemoryBroker.nodes.pop(self.node_id, None)
+
+    async def publish(self, message: dict):
+        others = [node for node_id, node in InMemoryBroker.nodes.items() if node_id != self.node_id]
+        if not others:  # single node, nothing to encode
+            return
+        body = encode(message)
+        for node in others:
+            asyncio.create_task(node.dispatch(body))
+
+    async def send(self, node_id: str, message: dict):
+        node = InMemoryBroker.nodes.get(node_id)
+        if node is None:
+            raise BrokerError(f"Node {node_id} is not reachable")
+        return decode(await node.dispatch(encode(message)))["reply"]
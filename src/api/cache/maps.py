@@ -1,25 +1,44 @@
+import hashlib
+
 from cache.base import FileSystemCache
 from settings import settings
 
+MAP_SAMPLE_INTERVAL = 2  # metres between polyline points of the rendered map
+RENDER_VERSION = 2  # bump when render_map output changes, old renders are then ignored
+
+
+def layout_key(layout: str) -> str:
+    '''
+    Rendered map depends only on the layout (and how it is rendered), not on the map row
+    '''
+    content = f"{layout}:{MAP_SAMPLE_INTERVAL}:{RENDER_VERSION}"
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
 class MapCache(FileSystemCache):
+    '''
+    Content-addressed cache of rendered maps ({'map': render_map(...)}), keyed by layout hash.
+    Filled by workers when they render a map, so every map with the same layout
+    (and every scenario on it) reuses one render.
+    No `loaded` index: the file is looked up directly, it may be written by another process.
+    '''
+
+    def get_filename(self, layout):
+        return self.dir / f"{layout_key(layout)}.json"
 
-    def get_filename(self, map_id):
-        return self.dir / f"{map_id}.json"
+    def exists(self, layout):
+        return self.get_filename(layout).exists()
     
-    def add_map(self, map_id, blob):
-        self.loaded[map_id] = True
-        self.write(self.get_filename(map_id), blob)
+    def add_map(self, layout, blob):
+        self.write(self.get_filename(layout), blob)
 
-    def invalidate(self, map_id):
-        self.loaded.pop(map_id, None)
-        self.remove(self.get_filename(map_id))
+    def invalidate(self, layout):
+        self.remove(self.get_filename(layout))
 
-    
-    def get(self, map_id):
-        if not self.exists(map_id):
+    def get(self, layout):
+        try:
+            return self.read(self.get_filename(layout))  # kept in memory_cache while the mtime matches
+        except FileNotFoundError:  # not rendered yet or invalidated
             return None
-        
-        return self.read(self.get_filename(map_id))
     
 map_cache = MapCache(settings.maps_dir)
-
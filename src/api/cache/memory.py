@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+from settings import settings
+
+
+class MemoryLRU:
+    '''
+    Size-bounded in-memory tier above the file caches.
+    Holds decoded JSON objects keyed by file path; the size of an entry is the size of its file.
+    Cached objects are shared between requests and must not be mutated by callers.
+    '''
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()  # maps are rendered and read in worker threads (asyncio.to_thread)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+
+    def put(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def _pop(self, key):
+        if key in self.entries:
+            _, size = self.entries.pop(key)
+            self.bytes -= size
+
+    def invalidate(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def invalidate_prefix(self, prefix: str):
+        with self.lock:
+            for key in [k for k in self.entries if str(k).startswith(prefix)]:
+                self._pop(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "evictions": self.evictions,
+        }
+
+
+memory_cache = MemoryLRU(settings.memory_cache_bytes)
@@ -7,18 +7,39 @@ class OfflineBlobAdapter(FileSystemCache):
     def get_filename(self, scenario_id: int, turn: int) -> Path:
         return self.dir / str(scenario_id) / f"{turn}.json"
 
+    def rebuild_index(self):
+        self.loaded = {}
+        for path in self.dir.iterdir():
+            if path.is_dir() and path.name.isdigit():
+                if (turn := self.scan_turns(int(path.name))) is not None:
+                    self.loaded[int(path.name)] = turn
+
+    def scan_turns(self, scenario_id: int) -> int | None:
+        turns = [int(path.stem) for path in (self.dir / str(scenario_id)).glob("*.json") if path.stem.isdigit()]
+        return max(turns, default=None)
+
     def save_blob(self, scenario_id: int, response: dict) -> int:
-        turn = self.loaded.get(scenario_id, 0) + 1
-        self.loaded[scenario_id] = turn
+        turn = (self.latest_turn(scenario_id) or 0) + 1
 
         filename = self.get_filename(scenario_id, turn)
         filename.parent.mkdir(parents=True, exist_ok=True)
-        self.write(filename, response)
+        while not self.write_new(filename, response):  # turn claimed by another process => take the next one
+            turn += 1
+            filename = self.get_filename(scenario_id, turn)
+        self.loaded[scenario_id] = turn
 
         return turn  # useful if caller wants it
 
     def latest_turn(self, scenario_id: int) -> int | None:
-        return self.loaded.get(scenario_id)
+        # Turns are only appended, so a missing or newer file on disk means another process
+        # (or a previous run) saved it
+        turn = self.loaded.get(scenario_id)
+        next_file = self.get_filename(scenario_id, (turn or 0) + 1)
+        if turn is None or next_file.exists():
+            turn = self.scan_turns(scenario_id)
+            if turn is not None:
+                self.loaded[scenario_id] = turn
+        return turn
 
     def has_newer_than(self, scenario_id: int, turn: int) -> bool:
         latest = self.latest_turn(scenario_id)
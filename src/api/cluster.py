@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+from broker.base import BrokerError, create_broker
+from db.registry_repository import ScenarioRegistry
+from settings import settings
+
+
+class ClusterNode:
+    '''
+    Scenario-affinity routing between API processes (nodes).
+
+    Every scenario is owned by the node that runs its simulation worker (ScenarioRegistry).
+    `call` runs an operation of a scenario on its owner: locally or forwarded through the broker.
+    `publish` sends an event of a scenario to all other nodes (e.g. frames for their websockets).
+    Operations and events are coroutines registered with `handler(op)`.
+    '''
+
+    def __init__(self, node_id: str, broker):
+        self.node_id = node_id
+        self.broker = broker
+        self.handlers = {}
+        self.owners = {}  # scenario_id -> node_id, filled lazily from the registry
+        self.heartbeat_task = None
+        broker.on_message(self.handle)
+
+    def handler(self, op: str):
+        def register(func):
+            self.handlers[op] = func
+            return func
+        return register
+
+    async def start(self):
+        await ScenarioRegistry.release_node(self.node_id)  # left over by a previous run of this node
+        await ScenarioRegistry.heartbeat(self.node_id)
+        await self.broker.start()
+        self.heartbeat_task = asyncio.create_task(self.keep_alive())
+
+    async def close(self):
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+        await ScenarioRegistry.release_node(self.node_id)
+        await self.broker.close()
+
+    async def keep_alive(self):
+        '''
+        Refresh the heartbeat of this node and drop owners of nodes that stopped sending theirs
+        (crashed, or restarted under a new node id)
+        '''
+        while True:
+            await asyncio.sleep(settings.node_heartbeat)
+            try:
+                await ScenarioRegistry.heartbeat(self.node_id)
+                await ScenarioRegistry.expire_nodes()
+            except Exception:
+                logging.exception(f"Heartbeat of node {self.node_id} failed")
+
+    async def owner(self, scenario_id: int, claim=False):
+        if scenario_id not in self.owners:
+            if claim:
+                owner = await ScenarioRegistry.claim(scenario_id, self.node_id)
+            else:
+                owner = await ScenarioRegistry.get_owner(scenario_id)
+            if owner is None:
+                return None
+            self.owners[scenario_id] = owner
+        return self.owners[scenario_id]
+
+    async def call(self, scenario_id: int, op: str, claim=False, **payload):
+        '''
+        Run op on the owner of the scenario, with claim=True this node becomes the owner if there is none
+        '''
+        owner = await self.owner(scenario_id, claim)
+        if owner is None:
+            raise BrokerError(f"Scenario {scenario_id} is not running on any node")
+
+        if owner == self.node_id:
+            return await self.handlers[op](scenario_id=scenario_id, **payload)
+
+        try:
+            return await self.broker.send(owner, {"op": op, "scenario_id": scenario_id, **payload})
+        except BrokerError:
+            self.owners.pop(scenario_id, None)  # look it up again next time
+            if claim and await self.owner(scenario_id, claim=True) not in (owner, None):
+                return await self.call(scenario_id, op, **payload)  # dead owner was replaced
+            raise
+
+    async def publish(self, scenario_id: int, op: str, **payload):
+        await self.broker.publish({"op": op, "scenario_id": scenario_id, **payload})
+
+    async def release(self, scenario_id: int):
+        self.owners.pop(scenario_id, None)
+        await ScenarioRegistry.release(scenario_id, self.node_id)
+        await self.publish(scenario_id, "node.released")
+
+    async def handle(self, message: dict):
+        op = message.pop("op")
+        if op == "node.released":
+            self.owners.pop(message["scenario_id"], None)
+            return None
+
+        handler = self.handlers.get(op)
+        if handler is None:
+            logging.warning(f"Node {self.node_id} has no handler for {op}")
+            return None
+        return await handler(**message)
+
+
+node = ClusterNode(settings.node_id, create_broker(settings.broker, settings.node_id))
@@ -3,6 +3,11 @@ class Constants:
         MOVE_ACCELERATION_SENSITIVITY = 0.3 # [0,1]
         MOVE_STEERING_SENSITIVITY = 0.15 # [0,1]
 
-        WS_MOVE_TIMEOUT = 0.1 # If frontend does not submit move during this => emits KEEP ALIVE
+        WS_SEND_QUEUE = 4 # frames queued per client before stale ones are dropped
+        WS_CLOSE_TIMEOUT = 2 # seconds to flush pending messages before closing a websocket
+
+        DELTA_KEYFRAME_INTERVAL = 50 # frames between full keyframes in delta protocol
+        DELTA_POSITION_SCALE = 100 # positions and velocities are sent in cm (cm/s)
+        DELTA_HEADING_SCALE = 1000 # heading is sent in mrad
 
 
@@ -1,11 +1,91 @@
+import time
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
+from fastapi.requests import HTTPConnection
 from settings import settings
 from models import Base
+from metrics import LatencyStats
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-engine = create_async_engine(settings.db_url)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+engine = create_async_engine(
+    settings.db_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args={"statement_cache_size": settings.db_statement_cache_size},
+)
+session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+# session shared by all repositories within one HTTP request (see use_request_session)
+request_scope: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+query_time = LatencyStats()
+connection_hold_time = LatencyStats()  # checkout -> checkin of pooled connections
+
+
+@asynccontextmanager
+async def async_session():
+    '''
+    Session of the current request if there is one, otherwise a new session closed on exit.
+    The request session ends its transaction when the outermost block exits, so its
+    connection goes back to the pool between repository calls (e.g. while a turn simulates)
+    '''
+    scope = request_scope.get()
+    if scope is None or scope.get("closed"):
+        async with session_factory() as session:
+            yield session
+        return
+
+    if scope.get("session") is None:
+        scope["session"] = session_factory()
+    session = scope["session"]
+    scope["depth"] = scope.get("depth", 0) + 1
+    failed = False
+    try:
+        yield session
+    except DBAPIError:
+        failed = True
+        await session.rollback()  # do not leave a failed transaction to the rest of the request
+        raise
+    except Exception:
+        failed = True
+        raise
+    finally:
+        scope["depth"] -= 1
+        if scope["depth"] == 0:
+            await end_transaction(session, failed)
+
+
+async def end_transaction(session, failed=False):
+    if failed or session.new or session.dirty or session.deleted:
+        await session.close()  # uncommitted changes are discarded, as closing own sessions always did
+    elif session.in_transaction():
+        await session.commit()  # read only: loaded objects stay usable (expire_on_commit=False)
+
+
+async def use_request_session(conn: HTTPConnection):
+    '''
+    App dependency: repositories called while handling an HTTP request reuse one session
+    (and so one pooled connection). Websockets keep opening a session per operation,
+    they would otherwise hold a connection for their whole lifetime.
+    '''
+    if conn.scope["type"] != "http":
+        yield
+        return
+
+    scope = {}
+    request_scope.set(scope)
+    try:
+        yield
+    finally:
+        scope["closed"] = True  # tasks spawned by the request fall back to own sessions
+        if session := scope.pop("session", None):
+            await session.close()
 
 
 async def get_session():
@@ -13,6 +93,43 @@ async def get_session():
         yield session
 
 
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    if (start := conn.info.pop("query_start", None)) is not None:
+        query_time.add(time.perf_counter() - start)
+
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _connection_checkout(dbapi_conn, record, proxy):
+    record.info["checkout"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine.pool, "checkin")
+def _connection_checkin(dbapi_conn, record):
+    if (start := record.info.pop("checkout", None)) is not None:
+        connection_hold_time.add(time.perf_counter() - start)
+
+
+def db_stats():
+    pool = engine.sync_engine.pool
+    return {
+        "pool": {
+            "size": pool.size(),
+            "max_overflow": settings.db_max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        },
+        "connection_hold": connection_hold_time.to_dict(),
+        "queries": query_time.to_dict(),
+    }
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
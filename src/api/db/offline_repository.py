@@ -1,24 +1,17 @@
 from typing import List
 
 from models.offline_scenario import OfflineScenarioMoveSequence, OfflineScenarioMove
-from db.scenario_repository import ScenarioRepository
+from models.scenario import Vehicle
+from db.readiness_repository import TurnReadiness
 from database import async_session
 from schemas.offline import OfflineScenarioPreview, DiscreteMove
-from sqlalchemy import select, func
+from sqlalchemy import select, func, delete, and_
 from sqlalchemy.orm import joinedload
-from db.scenario_repository import ScenarioRepository
 from sqlalchemy.orm import attributes
 import logging
 
 class OfflineScheduler:
 
-    @classmethod
-    async def total_steps_db(cls, session, seq_id: int) -> int:
-        return await session.scalar(
-            select(func.coalesce(func.sum(OfflineScenarioMove.steps), 0))
-            .where(OfflineScenarioMove.sequence_id == seq_id)
-        ) or 0
-    
     @classmethod
     def seq_to_dict(cls, moveseq):
         if not moveseq:
@@ -29,68 +22,86 @@ class OfflineScheduler:
     @classmethod
     async def get_global_move(cls, scenario_id: int, vehicle_id: int) -> OfflineScenarioMoveSequence:
         async with async_session() as session:
-            self_move = await cls.get_active_move(session, scenario_id, vehicle_id)
-            global_move = await cls.collect_move(session, self_move)
+            if not await TurnReadiness.claim_turn(session, scenario_id):
+                return None  # not complete yet or executed by a concurrent submit
 
-            if global_move:
-                sequence_lengths = [await cls.total_steps_db(session, moveseq.id) for moveseq in global_move]
-                logging.warning(sequence_lengths)
-                min_length = min(sequence_lengths)
-                sequences_to_exec = []
-                next_move = None
+            pending = await cls.pending_sequences(session, scenario_id)
+            if pending is None:
+                await TurnReadiness.sync(session, scenario_id)  # counters were off, recount
+                await session.commit()
+                return None
 
-                for seq in global_move:
+            min_length = min(total for _, total in pending)
+            to_split = [seq for seq, total in pending if total > min_length]
+            halves = await cls.split_sequences(session, to_split, min_length)
+
+            sequences_to_exec = []
+            next_move = None
+            for seq, total in pending:
+                if seq.id in halves:
+                    first, second = halves[seq.id]
+                    sequences_to_exec.append(first)
+                    if seq.vehicle_id == vehicle_id:
+                        next_move = cls.seq_to_dict(second)
+                else:
                     seq.is_executed = True
-                    if seq.total_steps() > min_length:
-                        first, second = await cls.split_move_sequence(session, seq, min_length)
-                        first.is_executed = True
-                        sequences_to_exec.append(first)
+                    sequences_to_exec.append(seq)
 
-                        if seq.vehicle_id == vehicle_id:
-                            next_move = cls.seq_to_dict(second)
-                        
-
-                    else:
-                        sequences_to_exec.append(seq)
+            await session.commit()
 
-                    
+            return {
+                'steps': min_length,
+                'moves': [cls.seq_to_dict(moveseq) for moveseq in sequences_to_exec],
+                'next': next_move
+            }
 
-                await session.commit()
-                
-                sequence_jsons = [cls.seq_to_dict(moveseq) for moveseq in sequences_to_exec]
+    @classmethod
+    async def pending_sequences(cls, session, scenario_id: int):
+        '''
+        Latest not executed move sequence of every active human vehicle with its total steps, in one query.
+        None if some vehicle has not submitted yet
+        '''
+        total = (
+            select(func.coalesce(func.sum(OfflineScenarioMove.steps), 0))
+            .where(OfflineScenarioMove.sequence_id == OfflineScenarioMoveSequence.id)
+            .correlate(OfflineScenarioMoveSequence)
+            .scalar_subquery()
+        )
+        q = (
+            select(Vehicle.id, OfflineScenarioMoveSequence, total)
+            .outerjoin(OfflineScenarioMoveSequence, and_(
+                OfflineScenarioMoveSequence.vehicle_id == Vehicle.id,
+                OfflineScenarioMoveSequence.scenario_id == scenario_id,
+                OfflineScenarioMoveSequence.is_executed.is_(False),
+                OfflineScenarioMoveSequence.is_editable.is_(False),
+            ))
+            .options(joinedload(OfflineScenarioMoveSequence.moves))
+            .where(
+                Vehicle.scenario_id == scenario_id,
+                Vehicle.assigned_user_id.is_not(None),
+                Vehicle.is_terminated.is_not(True),
+            )
+            .order_by(Vehicle.id, OfflineScenarioMoveSequence.id.desc())
+        )
+        res = await session.execute(q)
 
-                print(sequence_lengths)
-                multiplayer_sequence = {
-                    'steps': min_length,
-                    'moves': sequence_jsons,
-                    'next': next_move
-                }
+        latest = {}
+        for vid, seq, steps in res.unique().all():
+            latest.setdefault(vid, (seq, steps))  # rows are newest first per vehicle
 
-                return multiplayer_sequence
+        if not latest:
             return None
-
-    @classmethod
-    async def collect_move(cls, session, self_move: OfflineScenarioMoveSequence):
-        scenario_db = await ScenarioRepository.get_scenario(session, self_move.scenario_id)
-        vehicles_ids = [vehicle.id for vehicle in scenario_db.vehicles if vehicle.assigned_user_id and not vehicle.is_terminated]
-        vehicles_ids.remove(self_move.vehicle_id)
-        move_seqs = [self_move]
-        for vehicle_id in vehicles_ids:
-            move_seq = await cls.get_active_move(session, scenario_db.id, vehicle_id)
-            if not move_seq:
-                logging.warning(f"No move from {vehicle_id}")
+        for vid, (seq, _) in latest.items():
+            if seq is None:
+                logging.warning(f"No move from {vid}")
                 return None
 
-            move_seqs.append(move_seq)
-
-        return move_seqs
-
-
+        return list(latest.values())
 
     @classmethod
-    async def get_active_move(cls, session, scenario_id: int, vehicle_id: int, editable=False):
+    async def find_move(cls, session, scenario_id: int, vehicle_id: int, editable=False):
         '''
-        Returns user`s move that is not executed yet
+        Latest not executed move of the user, without changing it
         '''
         q = (
             select(OfflineScenarioMoveSequence)
@@ -105,13 +116,19 @@ class OfflineScheduler:
             .limit(1)
         )
         res = await session.execute(q)
-        latest = res.scalars().first()
+        return res.scalars().first()
 
-        # res = await session.execute(query)
-        # move_seq = res.unique().scalar_one_or_none()
+    @classmethod
+    async def get_active_move(cls, session, scenario_id: int, vehicle_id: int, editable=False):
+        '''
+        Returns user`s move that is not executed yet.
+        An editable one (rest of a split sequence) is submitted as the next move of the user
+        '''
+        latest = await cls.find_move(session, scenario_id, vehicle_id, editable)
 
         if latest and editable:
-            latest.is_editable = False
+            latest.is_editable = False  # the rest of a split sequence becomes the next submitted move
+            await TurnReadiness.submit(session, scenario_id, vehicle_id)
             await session.commit()
 
         return latest
@@ -120,19 +137,21 @@ class OfflineScheduler:
     @classmethod
     async def save_move(cls, move):
         '''
-        Save single user move in database
+        Save single user move in database, returns True if all players have submitted the turn
         '''
         async with async_session() as session:
             if await cls.get_active_move(session, move.scenario_id, move.vehicle_id):
-                return
+                return await TurnReadiness.is_ready(session, move.scenario_id)
             scenario_db = OfflineScenarioMoveSequence(
                 scenario_id=move.scenario_id,
                 vehicle_id=move.vehicle_id,
             )
             session.add(scenario_db)
-            await session.commit()
-            await session.refresh(scenario_db)
+            await session.flush()
             await cls.assign_moves(session, scenario_db.id, move.moves)
+            ready = await TurnReadiness.submit(session, move.scenario_id, move.vehicle_id)
+            await session.commit()
+            return ready
 
     @classmethod
     async def assign_moves(cls, session, sequence_id:int, moves: List[DiscreteMove]):
@@ -147,15 +166,14 @@ class OfflineScheduler:
         ) for move in moves]
 
         session.add_all(moves_db)
-        await session.commit()
+        await session.flush()
 
 
     @classmethod
-    async def split_move_sequence(cls, session, move_sequence:OfflineScenarioMoveSequence, k: int):
+    def split_moves(cls, moves, k: int):
         '''
-            Function splits move sequence into 2 move sequences and stores to db
+        Split a move list into new moves for the first k steps and for the rest
         '''
-
         def clone_move(move, steps):
             return OfflineScenarioMove(
                 steps=steps,
@@ -163,79 +181,72 @@ class OfflineScheduler:
                 acceleration = move.acceleration,
                 sequence_id = None
             )
-        
 
         curr_steps = 0
         first_moves = []
         second_moves = []
 
-        for ind, move in enumerate(move_sequence.moves):
-            if curr_steps + move.steps < k:
-                first_moves.append(clone_move(move, move.steps))
-                curr_steps += move.steps
-
-            else:
-                steps_first = k - curr_steps
-
-                if steps_first > 0:
-                    move_first = clone_move(move, steps_first)
-
-                    first_moves.append(move_first)
-                
-                steps_second = move.steps - steps_first
-
-                if steps_second > 0:
-                    move_second = clone_move(move, steps_second)
-
-                    second_moves.append(move_second)
-
-                for m in move_sequence.moves[ind+1:]:
-                    second_moves.append(m)
+        for move in moves:
+            steps_first = min(max(k - curr_steps, 0), move.steps)
+            if steps_first > 0:
+                first_moves.append(clone_move(move, steps_first))
+            if move.steps - steps_first > 0:
+                second_moves.append(clone_move(move, move.steps - steps_first))
+            curr_steps += move.steps
 
-                break
+        return first_moves, second_moves
 
+    @classmethod
+    async def split_sequences(cls, session, move_sequences: List[OfflineScenarioMoveSequence], k: int):
+        '''
+            Splits every sequence into an executed one with first k steps and an editable rest.
+            Returns {old sequence id: (first, second)}, the old sequences are deleted
+        '''
+        if not move_sequences:
+            return {}
+
+        halves = {}
+        moves = {}
+        for move_sequence in move_sequences:
+            first_seq = OfflineScenarioMoveSequence(
+                scenario_id = move_sequence.scenario_id,
+                vehicle_id = move_sequence.vehicle_id,
+                is_editable = False,
+                is_executed = True,
+            )
+            second_seq = OfflineScenarioMoveSequence(
+                scenario_id = move_sequence.scenario_id,
+                vehicle_id = move_sequence.vehicle_id,
+                is_editable = True
+            )
+            halves[move_sequence.id] = (first_seq, second_seq)
+            moves[move_sequence.id] = cls.split_moves(move_sequence.moves, k)
 
-        first_seq = OfflineScenarioMoveSequence(
-            scenario_id = move_sequence.scenario_id,
-            vehicle_id = move_sequence.vehicle_id,
-            is_editable = False
-        )
-
-        second_seq = OfflineScenarioMoveSequence(
-            scenario_id = move_sequence.scenario_id,
-            vehicle_id = move_sequence.vehicle_id,
-            is_editable = True
-        )
-
-        session.add_all([first_seq, second_seq])
-        await session.flush()  # assign PKs without expiring
+        session.add_all([seq for pair in halves.values() for seq in pair])
+        await session.flush()  # assign PKs of all new sequences at once
 
         # Set foreign keys directly; do NOT access first_seq.moves / second_seq.moves
-        for m in first_moves:
-            m.sequence_id = first_seq.id
-        for m in second_moves:
-            m.sequence_id = second_seq.id
-
-        session.add_all(first_moves + second_moves)
-        await session.flush()  # persist children
-
-        # Mark collections as loaded in-memory to avoid any lazy IO later
-        attributes.set_committed_value(first_seq, "moves", first_moves)
-        attributes.set_committed_value(second_seq, "moves", second_moves)
-
-        await session.delete(move_sequence)
+        new_moves = []
+        for seq_id, (first_seq, second_seq) in halves.items():
+            first_moves, second_moves = moves[seq_id]
+            for m in first_moves:
+                m.sequence_id = first_seq.id
+            for m in second_moves:
+                m.sequence_id = second_seq.id
+            new_moves += first_moves + second_moves
+
+            # Mark collections as loaded in-memory to avoid any lazy IO later
+            attributes.set_committed_value(first_seq, "moves", first_moves)
+            attributes.set_committed_value(second_seq, "moves", second_moves)
+
+        session.add_all(new_moves)
+        for move_sequence in move_sequences:
+            session.expunge(move_sequence)
+        await session.execute(  # moves of old sequences are removed by ON DELETE CASCADE
+            delete(OfflineScenarioMoveSequence)
+            .where(OfflineScenarioMoveSequence.id.in_(list(halves)))
+            .execution_options(synchronize_session=False)
+        )
         await session.flush()
 
-        return first_seq, second_seq
-    
-
-
-
-
-
-
-
-
-
-
-
+        return halves
@@ -0,0 +1,112 @@
+from sqlalchemy import select, update, func, exists
+from sqlalchemy.dialects.postgresql import insert
+
+from models.offline_scenario import OfflineTurnReadiness, OfflineScenarioMoveSequence
+from models.scenario import Vehicle
+
+
+class TurnReadiness:
+    '''
+    Counters of submitted moves per offline scenario, updated in the transaction that creates
+    a pending move sequence, so a submit knows whether it completes the turn without
+    loading the moves of the other vehicles.
+    The row is (re)built from the move tables when missing or when a check says the turn
+    is not complete yet (sync), recounts of a scenario are serialized by an advisory lock.
+    '''
+
+    LOCK_NAMESPACE = 7301  # first key of pg_advisory_xact_lock(namespace, scenario_id)
+
+    @classmethod
+    def active_vehicles(cls, scenario_id: int):
+        return select(Vehicle.id).where(
+            Vehicle.scenario_id == scenario_id,
+            Vehicle.assigned_user_id.is_not(None),
+            Vehicle.is_terminated.is_not(True),
+        )
+
+    @classmethod
+    async def sync(cls, session, scenario_id: int) -> tuple[int, int]:
+        '''
+        Recount the turn from the move tables, returns (submitted, expected).
+        The lock is held until the transaction ends, so a concurrent recount waits for it
+        and then sees the sequence committed by this one
+        '''
+        await session.execute(select(func.pg_advisory_xact_lock(cls.LOCK_NAMESPACE, scenario_id)))
+        active = cls.active_vehicles(scenario_id)
+        expected = await session.scalar(select(func.count()).select_from(active.subquery()))
+        submitted = await session.scalar(
+            select(func.count(func.distinct(OfflineScenarioMoveSequence.vehicle_id)))
+            .where(
+                OfflineScenarioMoveSequence.scenario_id == scenario_id,
+                OfflineScenarioMoveSequence.vehicle_id.in_(active),
+                OfflineScenarioMoveSequence.is_executed.is_(False),
+                OfflineScenarioMoveSequence.is_editable.is_(False),
+            )
+        )
+        await session.execute(insert(OfflineTurnReadiness)
+                              .values(scenario_id=scenario_id, expected=expected, submitted=submitted)
+                              .on_conflict_do_update(index_elements=[OfflineTurnReadiness.scenario_id],
+                                                     set_={"expected": expected, "submitted": submitted}))
+        return submitted, expected
+
+    @classmethod
+    async def submit(cls, session, scenario_id: int, vehicle_id: int) -> bool:
+        '''
+        Count a new pending sequence of the vehicle, True if it completes the turn
+        '''
+        res = await session.execute(
+            update(OfflineTurnReadiness)
+            .where(
+                OfflineTurnReadiness.scenario_id == scenario_id,
+                exists(cls.active_vehicles(scenario_id).where(Vehicle.id == vehicle_id)),
+            )
+            .values(submitted=OfflineTurnReadiness.submitted + 1)
+            .returning(OfflineTurnReadiness.submitted, OfflineTurnReadiness.expected)
+        )
+        row = res.first()
+        if row is None:  # first turn of the scenario (or the vehicle is not playing)
+            row = await cls.sync(session, scenario_id)
+
+        submitted, expected = row
+        return submitted >= expected
+
+    @classmethod
+    async def is_ready(cls, session, scenario_id: int) -> bool:
+        '''
+        Used by resubmits, which create no sequence: recount if the counters say the turn is
+        not complete, so a lost update can not stall the scenario
+        '''
+        row = (await session.execute(
+            select(OfflineTurnReadiness.submitted, OfflineTurnReadiness.expected)
+            .where(OfflineTurnReadiness.scenario_id == scenario_id)
+        )).first()
+        if row is None or row[0] < row[1]:
+            row = await cls.sync(session, scenario_id)
+
+        submitted, expected = row
+        return submitted >= expected
+
+    @classmethod
+    async def claim_turn(cls, session, scenario_id: int) -> bool:
+        '''
+        Start the next turn if the current one is complete. The row stays locked until the
+        session commits, so concurrent submits can not execute the same turn twice
+        '''
+        res = await session.execute(
+            update(OfflineTurnReadiness)
+            .where(
+                OfflineTurnReadiness.scenario_id == scenario_id,
+                OfflineTurnReadiness.submitted >= OfflineTurnReadiness.expected,
+            )
+            .values(submitted=0)
+            .returning(OfflineTurnReadiness.scenario_id)
+        )
+        return res.first() is not None
+
+    @classmethod
+    async def vehicle_terminated(cls, session, scenario_id: int):
+        await session.execute(
+            update(OfflineTurnReadiness)
+            .where(OfflineTurnReadiness.scenario_id == scenario_id)
+            .values(expected=OfflineTurnReadiness.expected - 1)
+        )
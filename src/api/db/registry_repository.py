@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from database import async_session
+from models.registry import ScenarioOwner, NodeHeartbeat
+from settings import settings
+
+
+class ScenarioRegistry:
+
+    @classmethod
+    def alive_nodes(cls):
+        return select(NodeHeartbeat.node_id).where(
+            NodeHeartbeat.seen_at > func.now() - timedelta(seconds=settings.node_expiry))
+
+    @classmethod
+    async def get_owner(cls, scenario_id: int) -> str | None:
+        async with async_session() as session:
+            return await session.scalar(select(ScenarioOwner.node_id)
+                                        .where(ScenarioOwner.scenario_id == scenario_id,
+                                               ScenarioOwner.node_id.in_(cls.alive_nodes())))
+
+    @classmethod
+    async def claim(cls, scenario_id: int, node_id: str) -> str:
+        '''
+        Make node the owner of the scenario unless it already has a live one, returns the owner
+        '''
+        async with async_session() as session:
+            await session.execute(delete(ScenarioOwner)  # owner crashed or restarted under a new id
+                                  .where(ScenarioOwner.scenario_id == scenario_id,
+                                         ScenarioOwner.node_id.not_in(cls.alive_nodes())))
+            await session.execute(insert(ScenarioOwner)
+                                  .values(scenario_id=scenario_id, node_id=node_id)
+                                  .on_conflict_do_nothing(index_elements=[ScenarioOwner.scenario_id]))
+            owner = await session.scalar(select(ScenarioOwner.node_id)
+                                         .where(ScenarioOwner.scenario_id == scenario_id))
+            await session.commit()
+            return owner
+
+    @classmethod
+    async def release(cls, scenario_id: int, node_id: str):
+        async with async_session() as session:
+            await session.execute(delete(ScenarioOwner)
+                                  .where(ScenarioOwner.scenario_id == scenario_id,
+                                         ScenarioOwner.node_id == node_id))
+            await session.commit()
+
+    @classmethod
+    async def heartbeat(cls, node_id: str):
+        async with async_session() as session:
+            await session.execute(insert(NodeHeartbeat)
+                                  .values(node_id=node_id, seen_at=func.now())
+                                  .on_conflict_do_update(index_elements=[NodeHeartbeat.node_id],
+                                                         set_={"seen_at": func.now()}))
+            await session.commit()
+
+    @classmethod
+    async def expire_nodes(cls):
+        '''
+        Drop nodes without a recent heartbeat together with the scenarios they owned
+        '''
+        async with async_session() as session:
+            await session.execute(delete(ScenarioOwner)
+                                  .where(ScenarioOwner.node_id.not_in(cls.alive_nodes())))
+            await session.execute(delete(NodeHeartbeat)
+                                  .where(NodeHeartbeat.node_id.not_in(cls.alive_nodes())))
+            await session.commit()
+
+    @classmethod
+    async def release_node(cls, node_id: str):
+        '''
+        Drop all scenarios of the node (its workers do not outlive it)
+        '''
+        async with async_session() as session:
+            await session.execute(delete(ScenarioOwner).where(ScenarioOwner.node_id == node_id))
+            await session.execute(delete(NodeHeartbeat).where(NodeHeartbeat.node_id == node_id))
+            await session.commit()
@@ -4,6 +4,7 @@ from database import async_session
 from fastapi import HTTPException
 from sqlalchemy import select, or_
 from models.scenario import Scenario, Map, Vehicle
+from db.readiness_repository import TurnReadiness
 from sqlalchemy.orm import joinedload
 
 
@@ -105,6 +106,7 @@ class ScenarioRepository:
             return False
 
         vehicle.is_terminated = True
+        await TurnReadiness.vehicle_terminated(session, scenario_id)  # no longer expected in offline turns
 
         await session.commit()
 
@@ -1,4 +1,7 @@
 from typing import Optional
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from passlib.context import CryptContext
 from sqlalchemy.future import select
@@ -6,10 +9,16 @@ from sqlalchemy.future import select
 from models.user import User
 from database import async_session
 from auth.schemas import User as SUser, UserInDB
+from settings import settings
+from metrics import LatencyStats
 
 
 class UserRepository:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # bcrypt costs ~100ms of CPU per call, it runs here instead of on the event loop
+    hashing_pool = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
+    hashing_wait = LatencyStats()  # queued behind other hashes
+    hashing_time = LatencyStats()
 
 
     @classmethod
@@ -65,12 +74,36 @@ class UserRepository:
         return UserInDB(id=user.id, username=user.username, hashed_password=user.hashed_password)
 
     @classmethod
-    def hash_password(cls,password: str) -> str:
-        return cls.pwd_context.hash(password)
+    async def run_hashing(cls, func, *args):
+        '''
+        Run a bcrypt call in the bounded hashing pool
+        '''
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            return func(*args), started, time.perf_counter()
+
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(cls.hashing_pool, timed)
+        cls.hashing_wait.add(started - submitted)
+        cls.hashing_time.add(finished - started)
+        return result
 
     @classmethod
-    def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
-        return cls.pwd_context.verify(plain_password, hashed_password)
+    async def hash_password(cls,password: str) -> str:
+        return await cls.run_hashing(cls.pwd_context.hash, password)
+
+    @classmethod
+    async def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
+        return await cls.run_hashing(cls.pwd_context.verify, plain_password, hashed_password)
+
+    @classmethod
+    def hashing_stats(cls):
+        return {
+            "workers": settings.password_hash_workers,
+            "wait": cls.hashing_wait.to_dict(),
+            "hash": cls.hashing_time.to_dict(),
+        }
 
 
     @classmethod
@@ -79,7 +112,7 @@ class UserRepository:
             raise ValueError("User already exists")
 
         await cls.password_validator(password)
-        hashed_password = cls.hash_password(password)
+        hashed_password = await cls.hash_password(password)
 
         async with async_session() as session:
             db_user = User(username=username, hashed_password=hashed_password, is_admin=is_admin)
@@ -98,15 +131,20 @@ class UserRepository:
         
     @classmethod
     async def remove_user(cls, user_id):
+        '''
+        Returns the removed user (None if there was none)
+        '''
         user = await cls.get_user_by_id(user_id)
         
         if not user:
-            return
+            return None
     
         async with async_session() as session:
             await session.delete(user)
             await session.commit()
 
+        return user
+
 
 
 
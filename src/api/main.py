@@ -1,30 +1,48 @@
 import asyncio
 import os
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import uvicorn
 from uvicorn import Config, Server
 from settings import settings
-from database import init_db, deinit_db
+from database import init_db, deinit_db, use_request_session
 from routers.scenarios import router as tasks_router
 from routers.auth import router as auth_router
 from routers.maps import router as maps_router
 from routers.offline_scenarios import router as offline_router
 from routers.logs import router as logs_router
 from routers.users import router as users_router
+from routers.metrics import router as metrics_router
 from utils import create_admin, create_map, create_default_scenarios
 from cache.offline import blob_adapter
 from cache.maps import map_cache
+from sim.pool import worker_pool
+from sim.manager import warm_map_renders, manager as sim_manager, offline_manager
+from db.map_repository import MapRepository
+from cluster import node
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await node.start()
     await create_admin()
     await create_map()
     await create_default_scenarios()
+    blob_adapter.rebuild_index()
+    await worker_pool.fill()
+    layouts = [map_db.layout for map_db in await MapRepository.get_all_maps()]
+    warm_renders = asyncio.create_task(asyncio.to_thread(warm_map_renders, layouts))
     yield
+    warm_renders.cancel()  # the render in progress still finishes in its thread
+    with suppress(asyncio.CancelledError):
+        await warm_renders
+    await node.close()
+    await sim_manager.close()
+    await offline_manager.close()
+    worker_pool.close()
     # await deinit_db()
     # blob_adapter.clear_all()
     # map_cache.clear_all()
@@ -35,6 +53,7 @@ app = FastAPI(
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
     lifespan=lifespan,
+    dependencies=[Depends(use_request_session)],
 )
 
 origins = [
@@ -59,6 +78,7 @@ app.include_router(maps_router, prefix='/api')
 app.include_router(offline_router, prefix='/api')
 app.include_router(logs_router, prefix='/api')
 app.include_router(users_router, prefix='/api')
+app.include_router(metrics_router, prefix='/api')
 
 async def main():
     config = Config(app=app,host=settings.host, port=settings.port, reload=settings.debug)
@@ -68,4 +88,10 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if settings.api_workers > 1:
+        # every worker process is a separate node, scenarios are routed to their owner through the broker
+        if settings.broker == "memory":
+            raise RuntimeError("Several API workers need a shared broker, set broker=amqp")
+        uvicorn.run("main:app", host=settings.host, port=settings.port, workers=settings.api_workers)
+    else:
+        asyncio.run(main())
@@ -0,0 +1,46 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatencyStats:
+    '''
+    Rolling latency statistics (seconds in, milliseconds out).
+    Keeps totals for the whole process lifetime and a window of recent samples for percentiles.
+    '''
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(time.perf_counter() - start)
+
+    def percentile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        ind = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[ind]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": (self.total / self.count * 1000) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max * 1000,
+        }
@@ -1,5 +1,5 @@
 from models.base import Base
-from sqlalchemy import Column, Integer, ForeignKey, Boolean, String, Float
+from sqlalchemy import Column, Integer, ForeignKey, Boolean, String, Float, Index
 from sqlalchemy.orm import relationship
 
 
@@ -12,10 +12,16 @@ class OfflineScenarioMoveSequence(Base):
     vehicle_id = Column(Integer, ForeignKey('vehicle.id', ondelete='CASCADE'))
     vehicle = relationship('Vehicle')
 
-    moves = relationship('OfflineScenarioMove', back_populates='sequence', cascade='all, delete-orphan', passive_deletes=True)
+    moves = relationship('OfflineScenarioMove', back_populates='sequence', cascade='all, delete-orphan', passive_deletes=True,
+                         order_by='OfflineScenarioMove.id')
     is_executed = Column(Boolean, default=False)
     is_editable = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # pending sequences of a scenario / vehicle, newest first
+        Index('ix_offline_sequence_pending', 'scenario_id', 'vehicle_id', 'is_executed', 'is_editable', 'id'),
+    )
+
     def total_steps(self):
         return sum([move.steps for move in self.moves])
 
@@ -41,3 +47,14 @@ class ExecutedStep(Base):
     image_url = Column(String, nullable=True)
 
 
+
+
+class OfflineTurnReadiness(Base):
+    '''
+    Submission counters of the current offline turn (see db/readiness_repository.py)
+    '''
+    __tablename__ = 'offline_turn_readiness'
+
+    scenario_id = Column(Integer, ForeignKey('scenario.id', ondelete='CASCADE'), primary_key=True)
+    expected = Column(Integer, nullable=False)  # active human vehicles
+    submitted = Column(Integer, nullable=False, default=0)  # of them with a pending move sequence
@@ -0,0 +1,23 @@
+from models.base import Base
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+
+
+class ScenarioOwner(Base):
+    '''
+    API process (node) that runs the simulation worker of a scenario
+    '''
+    __tablename__ = 'scenario_owner'
+
+    scenario_id = Column(Integer, ForeignKey('scenario.id', ondelete='CASCADE'), primary_key=True)
+    node_id = Column(String, nullable=False, index=True)
+    claimed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class NodeHeartbeat(Base):
+    '''
+    Last sign of life of a node, owners without a recent heartbeat are considered dead
+    '''
+    __tablename__ = 'node_heartbeat'
+
+    node_id = Column(String, primary_key=True)
+    seen_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -29,6 +29,8 @@ class Scenario(Base):
     map = relationship('Map')
     status = Column(Enum(ScenarioStatus), nullable=False, default=ScenarioStatus.CREATED)
     is_offline = Column(Boolean)
+    frame_policy = Column(String, nullable=False, default="all", server_default="all")
+    frame_stride = Column(Integer, nullable=False, default=1, server_default="1")
     # map = Column(String, nullable=False)
 
 class Map(Base):
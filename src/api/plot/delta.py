@@ -0,0 +1,91 @@
+import numpy as np
+from constants import Constants
+
+
+class DeltaEncoder:
+    '''
+    Compact encoder of realtime frames for one client (negotiated with ?protocol=delta).
+
+    Agent states are quantized to integers ([x, y, vx, vy, heading] * scales) and sent as:
+        key   - full quantized state of all agents + agent order
+        delta - difference to the previous frame, in the same agent order
+    Keyframes are sent every KEYFRAME_INTERVAL frames, when agents change, when the map
+    is attached and on the final frame. Static data (goals, humans, agents_map) is sent
+    only when it changes. Deltas are computed on quantized values, so the client
+    reconstructs the exact quantized state without drift.
+    '''
+
+    def __init__(self,
+                 keyframe_interval=Constants.RealTime.DELTA_KEYFRAME_INTERVAL,
+                 position_scale=Constants.RealTime.DELTA_POSITION_SCALE,
+                 heading_scale=Constants.RealTime.DELTA_HEADING_SCALE):
+        self.keyframe_interval = keyframe_interval
+        self.scales = np.array([position_scale] * 4 + [heading_scale], dtype=np.float64)
+        self.prev = None
+        self.agents = None
+        self.static = None
+        self.since_key = 0
+        self.seq = 0
+
+    def force_keyframe(self):
+        self.prev = None
+        self.static = None  # the frame that carried it may have been dropped
+
+    def quantize(self, positions):
+        if not positions:
+            return np.zeros((0, 5), dtype=np.int64)
+        rows = [[*s["position"], *s.get("velocity", (0, 0)), s.get("heading", 0)] for s in positions.values()]
+        return np.rint(np.array(rows, dtype=np.float64) * self.scales).astype(np.int64)
+
+    def get_static(self, positions, data):
+        return {
+            "goals": {aid: s["goal"] for aid, s in positions.items() if s.get("goal")},
+            "humans": [aid for aid, s in positions.items() if s.get("is_human")],
+            "agents_map": data.get("agents_map", {}),
+        }
+
+    def encode(self, data: dict) -> dict:
+        plt = data.get("plt")
+        if plt is None:  # lobby / service messages are sent as is
+            return data
+
+        positions = plt.get("positions") or {}
+        agents = list(positions)
+        current = self.quantize(positions)
+
+        message = {
+            "seq": self.seq,
+            "step": data.get("step"),
+            "time": data.get("time"),
+            "alive": data.get("alive"),
+        }
+        if data.get("reason"):
+            message["reason"] = data["reason"]
+
+        is_key = (self.prev is None
+                  or agents != self.agents
+                  or self.since_key >= self.keyframe_interval
+                  or not data.get("alive")
+                  or bool(plt.get("map")))
+
+        if is_key:
+            message["type"] = "key"
+            message["agents"] = agents
+            message["scales"] = self.scales.tolist()
+            message["state"] = current.tolist()
+            if plt.get("map"):
+                message["map"] = plt["map"]
+            self.since_key = 0
+        else:
+            message["type"] = "delta"
+            message["d"] = (current - self.prev).tolist()
+            self.since_key += 1
+
+        static = self.get_static(positions, data)
+        if static != self.static:
+            message["static"] = static
+            self.static = static
+
+        self.prev, self.agents = current, agents
+        self.seq += 1
+        return message
@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+
+# Douglas-Peucker tolerance (metres) of every level of detail, level 0 is the full render
+LOD_TOLERANCES = [0.0, 0.25, 1.0, 4.0]
+TILE_SIZE = 100.0  # metres
+
+
+def simplify(polyline, tolerance: float):
+    '''
+    Douglas-Peucker simplification of a flat [x0, y0, x1, y1, ...] polyline, end points are kept
+    '''
+    points = np.asarray(polyline, dtype=np.float64).reshape(-1, 2)
+    if tolerance <= 0 or len(points) < 3:
+        return list(polyline)
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(*ab)
+        if length == 0:
+            dist = np.hypot(*(inner - a).T)
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+
+        ind = int(np.argmax(dist))
+        if dist[ind] > tolerance:
+            mid = start + 1 + ind
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+
+    return points[keep].ravel().tolist()
+
+
+def get_level(level) -> int:
+    return min(max(int(level or 0), 0), len(LOD_TOLERANCES) - 1)
+
+
+def lod_map(rendered_map: dict, level: int) -> dict:
+    '''
+    Rendered map (see BaseWorker.render_map) with simplified polylines
+    '''
+    level = get_level(level)
+    if not rendered_map or level == 0:
+        return rendered_map
+
+    tolerance = LOD_TOLERANCES[level]
+    return {
+        **rendered_map,
+        "lod": level,
+        "features": [{**f, "polyline": simplify(f["polyline"], tolerance)}
+                     for f in rendered_map.get("features", [])],
+    }
+
+
+def feature_bounds(feature):
+    points = np.asarray(feature["polyline"], dtype=np.float64).reshape(-1, 2)
+    return (*points.min(axis=0), *points.max(axis=0))
+
+
+def map_tiles(rendered_map: dict, tile_size: float = TILE_SIZE) -> dict:
+    '''
+    Grid of the map: {"size": tile_size, "tiles": [[tx, ty], ...]} with the tiles that have features
+    '''
+    tiles = set()
+    for feature in rendered_map.get("features", []):
+        x0, y0, x1, y1 = feature_bounds(feature)
+        for tx in range(math.floor(x0 / tile_size), math.floor(x1 / tile_size) + 1):
+            for ty in range(math.floor(y0 / tile_size), math.floor(y1 / tile_size) + 1):
+                tiles.add((tx, ty))
+    return {"size": tile_size, "tiles": sorted(tiles)}
+
+
+def map_tile(level_map: dict, tx: int, ty: int, tile_size: float = TILE_SIZE) -> dict:
+    '''
+    Features of a lod_map whose bounding box overlaps tile (tx, ty); polylines are not cut
+    '''
+    x0, y0 = tx * tile_size, ty * tile_size
+    x1, y1 = x0 + tile_size, y0 + tile_size
+
+    features = []
+    for feature in level_map.get("features", []):
+        fx0, fy0, fx1, fy1 = feature_bounds(feature)
+        if fx0 <= x1 and fx1 >= x0 and fy0 <= y1 and fy1 >= y0:
+            features.append(feature)
+
+    return {
+        "lane_width": level_map.get("lane_width"),
+        "lod": level_map.get("lod", 0),
+        "tile": {"x": tx, "y": ty, "size": tile_size},
+        "features": features,
+    }
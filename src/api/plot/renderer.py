@@ -1,3 +1,6 @@
+from sim.frames import frames_to_json
+
+
 class Renderer:
     def __init__(self):
         self.is_map_sent = False
@@ -17,6 +20,6 @@ class Renderer:
                     'agents_map': state.get('agents_map', {}),
                     'reason': state.get('reason', None),
                     'trajectory': state.get('trajectory', None),
-                    'frames': state.get('frames', None),
+                    'frames': frames_to_json(state.get('frames', None)),
                     'tm_info': state.get('tm_info', None)
                 }
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import Response, FileResponse
+import asyncio
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import Response, FileResponse, StreamingResponse
 from db.scenario_repository import ScenarioRepository
 from models.scenario import ScenarioStatus
 from utils import get_log_filename
+from sim.logger import LogReader
+from sim import analysis
 from auth.auth import get_current_admin
 
 from database import async_session
@@ -12,6 +18,31 @@ router = APIRouter(
     tags=["logs"],
 )
 
+def analyse(scenario_ids, reference, agent, batch=False):
+    frame = analysis.load_states(scenario_ids, batch=batch)
+    result = analysis.summary(frame)
+    if reference is not None and not result.empty:
+        result["med"] = analysis.med(frame, reference, agent)
+
+    result = result.replace([np.inf, -np.inf], np.nan).astype(object)
+    return result.where(result.notna(), None).reset_index().to_dict("records")
+
+
+@router.get('/analysis')
+async def get_analysis(scenario_ids: Optional[List[int]] = Query(None),
+                       reference: Optional[int] = None,
+                       agent: str = "agent0",
+                       batch: bool = False,
+                       user=Depends(get_current_admin)):
+    '''
+    Aggregated metrics per scenario (all logged scenarios if scenario_ids is not set).
+    MED of `agent` against the `reference` scenario is added when reference is set.
+    With batch=true the runs of batch.py are analysed instead, one row per job
+    (scenario_id is the job index, reference too).
+    '''
+    return await asyncio.to_thread(analyse, scenario_ids, reference, agent, batch)
+
+
 @router.get('/{scenario_id}')
 async def get_log(scenario_id: int, user=Depends(get_current_admin)):
     async with async_session() as session:
@@ -26,6 +57,15 @@ async def get_log(scenario_id: int, user=Depends(get_current_admin)):
 
     abs, filename = get_log_filename(scenario_db.id, prefix)
 
-    return FileResponse(abs, media_type='application/json', filename=filename)
+    if abs.exists():  # exported or written by older versions
+        return FileResponse(abs, media_type='application/json', filename=filename)
+
+    reader = LogReader(scenario_db.id, prefix)
+    if not reader.exists():
+        return Response(status_code=404)
+
+    return StreamingResponse(reader.iter_json(),
+                             media_type='application/json',
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
     
\ No newline at end of file
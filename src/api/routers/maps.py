@@ -1,4 +1,6 @@
 import os
+import asyncio
+from functools import lru_cache
 
 from fastapi.exceptions import HTTPException
 
@@ -11,8 +13,8 @@ from db.map_repository import MapRepository
 
 from models.scenario import ScenarioStatus
 from sim.manager import map_preview
-from cache.maps import map_cache
-from auth.auth import get_current_admin
+from auth.auth import get_current_admin, get_current_user
+from plot.lod import lod_map, map_tiles, map_tile, get_level
 
 router = APIRouter(
     prefix='/maps',
@@ -34,7 +36,7 @@ async def delete_map(map_id: int, user=Depends(get_current_admin)):
 async def create_map(smap: SNamedMap, user=Depends(get_current_admin)):
     map_db = await MapRepository.create_map(smap.label, smap.layout)
 
-    return get_full_map(map_db)
+    return await asyncio.to_thread(get_full_map, map_db)  # a missing render starts a MetaDrive process
 
 
 def get_full_map(map_db: Map):
@@ -62,11 +64,9 @@ def get_full_map(map_db: Map):
 
 @router.put("/{map_id}")
 async def update_map(map_id: int, smap: SAddMap, user=Depends(get_current_admin)):
-    map_obj = await MapRepository.update_map(map_id, smap.layout)
+    map_obj = await MapRepository.update_map(map_id, smap.layout)  # renders are keyed by layout, nothing to invalidate
 
-    map_cache.invalidate(map_id)
-
-    return get_full_map(map_obj)
+    return await asyncio.to_thread(get_full_map, map_obj)
 
 @router.get('/{map_id}')
 async def preview_map(map_id: int, user=Depends(get_current_admin)):
@@ -74,4 +74,37 @@ async def preview_map(map_id: int, user=Depends(get_current_admin)):
     if not map_db:
         raise HTTPException(status_code=404, detail="Map not found")
 
-    return get_full_map(map_db)
+    return await asyncio.to_thread(get_full_map, map_db)
+
+
+@lru_cache(maxsize=64)
+def layout_lod(layout: str, level: int):
+    # renders are keyed by layout, so are their levels of detail (level normalized by get_level)
+    # blocking: a missing render starts a MetaDrive process, call it through lod_of
+    rendered = get_full_map(Map(id=0, layout=layout)).blob['map']
+    return lod_map(rendered, level), map_tiles(rendered)
+
+
+async def lod_of(layout: str, level: int):
+    return await asyncio.to_thread(layout_lod, layout, get_level(level))
+
+
+async def get_map_or_404(map_id: int):
+    map_db = await MapRepository.get_map_by_id(map_id)
+    if not map_db:
+        raise HTTPException(status_code=404, detail="Map not found")
+    return map_db
+
+
+@router.get('/{map_id}/lod/{level}')
+async def map_lod(map_id: int, level: int, user=Depends(get_current_user)):
+    map_db = await get_map_or_404(map_id)
+    rendered, tiling = await lod_of(map_db.layout, level)
+    return {**rendered, "tiling": tiling}
+
+
+@router.get('/{map_id}/tiles/{level}/{tx}/{ty}')
+async def map_lod_tile(map_id: int, level: int, tx: int, ty: int, user=Depends(get_current_user)):
+    map_db = await get_map_or_404(map_id)
+    level_map, _ = await lod_of(map_db.layout, level)
+    return map_tile(level_map, tx, ty)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends
+
+from auth.auth import get_current_admin, principal_cache
+from sim.pool import worker_pool
+from cache.memory import memory_cache
+from database import db_stats
+from db.user_repository import UserRepository
+from routers.scenarios import manager as connection_manager
+
+router = APIRouter(
+    prefix='/metrics',
+    tags=['metrics']
+)
+
+
+@router.get('/pool')
+async def pool_metrics(user=Depends(get_current_admin)):
+    return worker_pool.stats()
+
+
+@router.get('/connections')
+async def connection_metrics(user=Depends(get_current_admin)):
+    return connection_manager.stats()
+
+
+@router.get('/cache')
+async def cache_metrics(user=Depends(get_current_admin)):
+    return memory_cache.stats()
+
+
+@router.get('/db')
+async def db_metrics(user=Depends(get_current_admin)):
+    return db_stats()
+
+
+@router.get('/auth')
+async def auth_metrics(user=Depends(get_current_admin)):
+    return {"principals": principal_cache.stats(), "password_hashing": UserRepository.hashing_stats()}
@@ -1,25 +1,32 @@
 from typing import List
+import asyncio
 import logging
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import Response
 
 from schemas.offline import OfflineScenarioPreview, DiscreteMove
 from schemas.results import Scenario as SScenario, Vehicle as SVehicle
 
-from database import async_session
+from database import async_session, request_scope
 from db.scenario_repository import ScenarioRepository
 from db.offline_repository import OfflineScheduler
 from sim.manager import offline_manager
 from plot.renderer import Renderer
+from sim.frames import frames_to_json
 from cache.offline import blob_adapter
 from models.scenario import ScenarioStatus
 from auth.auth import get_current_user
+from routers.utils.connection import ConnectionManager
+from cluster import node
 
 router = APIRouter(
     prefix="/offline",
     tags=["offline"]
 )
 
+notifier = ConnectionManager()  # players waiting for the next turn
+pushes = set()  # notify_turn tasks started by submits, referenced until done
+
 # TODO: remove it later
 @router.post('/init/{scenario_id}')
 async def init_scenario(scenario_id: int, user=Depends(get_current_user)):
@@ -27,16 +34,33 @@ async def init_scenario(scenario_id: int, user=Depends(get_current_user)):
         scenario_db = await ScenarioRepository.get_scenario(session, scenario_id)
 
         scenario = SScenario.model_validate(scenario_db)
-        offline_manager.register_worker(scenario)
+        await node.call(scenario_id, "offline.register", claim=True, scenario=scenario.model_dump(mode="json"))
         return scenario
 
 
+# Run on the node owning the scenario worker (see cluster.py)
+@node.handler("offline.register")
+async def register_worker(scenario_id: int, scenario: dict):
+    await offline_manager.register_worker(SScenario(**scenario))
+
+
+@node.handler("offline.move")
+async def process_move(scenario_id: int, move: dict):
+    state = await offline_manager.process_move(move, scenario_id=scenario_id)
+    if 'frames' in state:
+        # ring views are overwritten by the next turn and would reach other nodes as nested lists
+        state['frames'] = frames_to_json(state['frames'])
+    if state.get('status') == "FINISHED":
+        await node.release(scenario_id)
+    return state
+
+
 @router.post('/preview')
 async def get_preview(move: OfflineScenarioPreview, user=Depends(get_current_user)):
     move_json = move.model_dump()
     move_json['is_preview'] = True
 
-    state = offline_manager.process_move(move_json, scenario_id=move.scenario_id)
+    state = await node.call(move.scenario_id, "offline.move", move=move_json)
 
     renderer = Renderer()
 
@@ -45,14 +69,45 @@ async def get_preview(move: OfflineScenarioPreview, user=Depends(get_current_use
     return response
 
 
-async def get_tm_status(session, state, scenario_id, vehicle_id):
+def tm_reason(state, vehicle_id):
     if tm_info := state.get('tm_info', None):
-        logging.warning(f"TM info: {tm_info}")
-        reason = tm_info.get(vehicle_id, None)
+        return tm_info.get(vehicle_id) or tm_info.get(str(vehicle_id))  # str keys once sent as JSON
+    return None
+
+
+async def get_tm_status(session, state, scenario_id, vehicle_id):
+    if reason := tm_reason(state, vehicle_id):
+        logging.warning(f"TM info: {state['tm_info']}")
+        await ScenarioRepository.set_vehicle_as_terminated(session, scenario_id, int(vehicle_id))
+        return reason
+    return None
+
+
+async def turn_payload(session, scenario_id: int, vehicle_id: int, turn: int, data: dict, claim_next=False):
+    '''
+    Executed turn as seen by one player (ping response and pushed message).
+    With claim_next the rest of the player's split sequence is submitted as the next move,
+    otherwise nothing is changed
+    '''
+    if claim_next:
+        tm = await get_tm_status(session, data, scenario_id, vehicle_id)
+        next_move = await OfflineScheduler.get_active_move(session, scenario_id, vehicle_id, editable=True)
+    else:
+        tm = tm_reason(data, vehicle_id)  # recorded by mark_terminated on the executing node
+        next_move = await OfflineScheduler.find_move(session, scenario_id, vehicle_id, editable=True)
+    return {"turn": turn,
+            "data": data,
+            "next": OfflineScheduler.seq_to_dict(next_move),
+            "tm": tm}
+
+
+async def mark_terminated(session, state, scenario_id):
+    '''
+    Record vehicles terminated by the turn right away, so the next turn does not wait for them
+    '''
+    for vehicle_id, reason in (state.get('tm_info') or {}).items():
         if reason:
             await ScenarioRepository.set_vehicle_as_terminated(session, scenario_id, int(vehicle_id))
-            return reason
-    return None
 
 
 @router.post('/submit')
@@ -62,20 +117,22 @@ async def post_preview(preview: OfflineScenarioPreview, user=Depends(get_current
         tm = await ScenarioRepository.is_vehicle_terminated(session, preview.scenario_id, preview.vehicle_id)
         if tm:
             return Response(status=405)
-        await OfflineScheduler.save_move(preview)
+        if not await OfflineScheduler.save_move(preview):
+            return {}  # waiting for other players
         collected_move =  await OfflineScheduler.get_global_move(preview.scenario_id, preview.vehicle_id)
         
         if collected_move:
             tm = None
             collected_move['is_preview'] = False
             next = collected_move.pop('next', None)
-            state = offline_manager.process_move(collected_move, scenario_id=preview.scenario_id)
+            state = await node.call(preview.scenario_id, "offline.move", move=collected_move)
             
             if state['status'] == 'FINISHED':
                 scenario_db = await ScenarioRepository.get_scenario(session, preview.scenario_id)
                 scenario_db.status = ScenarioStatus.FINISHED
                 await session.commit()
 
+            await mark_terminated(session, state, preview.scenario_id)
             tm = await get_tm_status(session, state, preview.scenario_id, preview.vehicle_id)
             logging.warning(f"Tm: {tm} for {preview.vehicle_id}")
 
@@ -86,12 +143,73 @@ async def post_preview(preview: OfflineScenarioPreview, user=Depends(get_current
             blob_adapter.save_blob(preview.scenario_id, response)
 
             turn = blob_adapter.latest_turn(preview.scenario_id)
-    
+
+            push_turn(preview.scenario_id, preview.vehicle_id, turn, response)
+            await node.publish(preview.scenario_id, "offline.turn",
+                               submitter_id=preview.vehicle_id, turn=turn, response=response)
 
             return {"turn": turn, "data": response, "next": next, "tm": tm}
         return {}
 
 
+@node.handler("offline.turn")  # turn executed through another node
+async def on_turn(scenario_id: int, submitter_id: int, turn: int, response: dict):
+    await notify_turn(scenario_id, submitter_id, turn, response)
+
+
+def push_turn(scenario_id: int, submitter_id: int, turn: int, response: dict):
+    '''
+    Notify waiting players in the background, the submit response does not wait for them
+    '''
+    task = asyncio.create_task(notify_turn(scenario_id, submitter_id, turn, response))
+    pushes.add(task)
+    task.add_done_callback(pushes.discard)
+
+
+async def notify_turn(scenario_id: int, submitter_id: int, turn: int, response: dict):
+    '''
+    Push the executed turn to every waiting player connected to this node once (same payload as ping).
+    Read only: the editable rest of a split sequence is claimed by the player's ping / submit
+    '''
+    request_scope.set(None)  # may outlive the submit request, use own sessions
+    async with async_session() as session:
+        for vehicle_id in notifier.connected_vehicles(scenario_id):
+            if vehicle_id == submitter_id:  # gets the turn as the submit response
+                continue
+            payload = await turn_payload(session, scenario_id, vehicle_id, turn, response)
+            await notifier.send_to_vehicle(scenario_id, vehicle_id, payload)
+
+    if not response['alive']:
+        await notifier.close_all(scenario_id)
+
+
+@router.websocket('/ws/{scenario_id}/{vehicle_id}/')
+async def turn_updates(websocket: WebSocket, scenario_id: int, vehicle_id: int):
+    token = websocket.headers.get('sec-websocket-protocol')
+
+    try:
+        user = await get_current_user(token)
+    except Exception:
+        await websocket.close(code=4001)
+        return
+
+    async with async_session() as session:
+        vehicle = await ScenarioRepository.get_vehicle(session, scenario_id, vehicle_id)
+
+    if not vehicle or vehicle.assigned_user_id != user.id:  # only the player driving the vehicle
+        await websocket.close(code=1008)
+        return
+
+    await notifier.connect(scenario_id, token, websocket, vehicle_id=vehicle_id)
+
+    try:
+        while True:
+            await websocket.receive_text()  # nothing is expected from the client, keeps the socket open
+    except (WebSocketDisconnect, RuntimeError):
+        await notifier.disconnect(scenario_id, websocket)
+
+
+# Fallback for clients without the turn_updates websocket
 @router.get('/ping/{scenario_id}/{vehicle_id}/{turn}')
 async def ping(scenario_id: int, vehicle_id: int, turn: int, user=Depends(get_current_user)):
     latest = blob_adapter.latest_turn(scenario_id)
@@ -99,15 +217,9 @@ async def ping(scenario_id: int, vehicle_id: int, turn: int, user=Depends(get_cu
         return Response(status_code=304)  # nothing new
     blob = blob_adapter.get_by_turn(scenario_id, latest)
     async with async_session() as session:
-        tm = await get_tm_status(session, blob, scenario_id, str(vehicle_id))
-        logging.warning(f"Tm: {tm} for {vehicle_id}")
-        next_move = await OfflineScheduler.get_active_move(session, scenario_id, vehicle_id, editable=True)
-                                                    
-
-    # include the latest turn so the client can update its cursor
-    return {"turn": latest, 
-            "data": blob, 
-            "next": OfflineScheduler.seq_to_dict(next_move),
-            "tm": tm}
+        # include the latest turn so the client can update its cursor
+        payload = await turn_payload(session, scenario_id, vehicle_id, latest, blob, claim_next=True)
+    logging.warning(f"Tm: {payload['tm']} for {vehicle_id}")
+    return payload
 
 
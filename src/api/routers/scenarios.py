@@ -15,12 +15,15 @@ from sqlalchemy.future import select
 from schemas.results import Move
 from auth.auth import get_current_user, get_current_admin
 from routers.utils.connection import ConnectionManager
+from routers.utils.scheduler import TickScheduler
+from routers.utils.fanout import FanoutConnections
+from broker.base import BrokerError
+from cluster import node
+from plot.lod import get_level
 from sim.workers.worker import Worker
 from sim.manager import manager as sim_manager
 
 from models.scenario import ScenarioStatus
-from plot.renderer import Renderer
-from constants import Constants
 
 router = APIRouter(
     prefix='/tasks',
@@ -54,7 +57,9 @@ async def create_scenario(scenario: SScenarioAdd, user=Depends(get_current_admin
 async def list_all_tasks(admin=Depends(get_current_admin)) -> List[SScenario]:
     return await ScenarioRepository.get_all()
 
-manager = ConnectionManager()
+manager = ConnectionManager()  # websockets held by this node
+scheduler = TickScheduler(sim_manager, FanoutConnections(manager, node, "realtime"))  # runs on the owner node
+lobby = {}  # scenario_id -> vehicle ids joined before start, kept by the owner node
 
 @router.get('/mine')
 async def users_tasks(user=Depends(get_current_user)):
@@ -98,74 +103,83 @@ async def connect_task(websocket: WebSocket, task_id: int, vehicle_id: int):
             return await websocket.close()
         
 
-        await manager.connect(task_id, token, websocket)
+    protocol = websocket.query_params.get('protocol', 'json')  # 'json' | 'delta'
+    lod = get_level(websocket.query_params.get('lod', 0))  # map level of detail for the client zoom
+    await manager.connect(task_id, token, websocket, protocol, vehicle_id, lod)
 
+    # the worker runs on the node owning the scenario, frames come back through FanoutConnections
+    try:
+        await node.call(task_id, "realtime.join", claim=True, scenario=scenario_schema.model_dump(mode="json"),
+                        vehicle_id=vehicle_id, node_id=node.node_id)
+    except BrokerError:  # owner node unreachable
+        logging.exception(f"Failed to join scenario {task_id}")
+        await manager.disconnect(task_id, websocket)  # closes the socket through its sender
+        return
 
-
-        sim_manager.register_worker(scenario_schema)
-
-        rendered = Renderer()
-
-        # Lobby check
-        required = len([v for v in scenario_schema.vehicles if v.assigned_user_id])
-        
-        while (curr := manager.count_connections(task_id)) < required:
-            await manager.broadcast_json(task_id, {
-                "status": "WAITING",
-                "connected": curr,
-                "required": required
-            })
-
-            await asyncio.sleep(1)
-
-        while True:
+    while True:
+        try:
+            data = await websocket.receive_json()
+            move = Move(scenario_id=task_id,
+                         vehicle_id=vehicle_id, 
+                         direction=data.get('direction'), 
+                         timestamp=data.get('timestamp'), 
+                         sens_acceleration=data.get('sens_acceleration', None),
+                         sens_steering=data.get('sens_steering', None)
+                        )
+            await node.call(task_id, "realtime.submit", move=move.model_dump())
+
+        except (WebSocketDisconnect, RuntimeError, BrokerError):  # RuntimeError => closed by scheduler
+            await manager.disconnect(task_id, websocket)
             try:
-                try:
-                    data = await asyncio.wait_for(websocket.receive_json(), Constants.RealTime.WS_MOVE_TIMEOUT) 
-                    dir = data.get('direction')
-                    a, s = data.get('sens_acceleration', None), data.get('sens_steering', None)
-                    time = data.get('timestamp')
-                except asyncio.TimeoutError:
-                    time = None
-                    dir = "KEEP_ALIVE"
-                    a, s = None, None
-
+                await node.call(task_id, "realtime.leave", vehicle_id=vehicle_id, node_id=node.node_id)
+            except BrokerError:  # scenario already finished
+                pass
+            return
 
-                move = Move(scenario_id=task_id,
-                             vehicle_id=vehicle_id, 
-                             direction=dir, 
-                             timestamp=time, 
-                             sens_acceleration=a,
-                             sens_steering=s
-                            )
-                state = sim_manager.process_move(move)
 
-            
-               
-                data = rendered.get_rendering_data(state, move.timestamp)
+@node.handler("realtime.join")
+async def join_scenario(scenario_id: int, scenario: dict, vehicle_id: int, node_id: str):
+    await sim_manager.register_worker(SScenario(**scenario))
+    scheduler.join(scenario_id, vehicle_id)
+    scheduler.connections.attach(scenario_id, node_id)  # node holding the websocket
+    scheduler.request_map(scenario_id)  # next frame carries the map for the new connection
 
-                if state['status'] == "ACTIVE":
-                    await manager.broadcast_json(task_id, data)
+    if scheduler.is_running(scenario_id):
+        return
 
-                if state['status'] == "FINISHED":
-                    scenario_db.status = ScenarioStatus.FINISHED
-                    await session.commit()
-                    await manager.broadcast_json(task_id, data)
-                    await manager.close_all(task_id)
-                    return
+    # Lobby check
+    joined = lobby.setdefault(scenario_id, set())
+    joined.add(vehicle_id)
+    required = len([v for v in scenario['vehicles'] if v['assigned_user_id']])
+
+    if len(joined) < required:
+        await scheduler.connections.broadcast_json(scenario_id, {
+            "status": "WAITING",
+            "connected": len(joined),
+            "required": required
+        })
+        return
 
-                if state['status'] == "TERMINATED":
-                    logging.info(f"Vehicle {vehicle_id} terminated in scenario {task_id}")
-                    await manager.send_personal_message(data, websocket)
-                    await manager.disconnect(task_id, websocket)
-                    return
-                
-            except WebSocketDisconnect:
-                await manager.disconnect(task_id, websocket)
-                return
+    lobby.pop(scenario_id, None)
+    scheduler.start(scenario_id, on_finish=finish_scenario)
 
 
+@node.handler("realtime.leave")
+async def leave_scenario(scenario_id: int, vehicle_id: int, node_id: str):
+    scheduler.leave(scenario_id, vehicle_id)
+    scheduler.connections.detach(scenario_id, node_id)
+    if joined := lobby.get(scenario_id):
+        joined.discard(vehicle_id)
 
 
+@node.handler("realtime.submit")
+async def submit_move(scenario_id: int, move: dict):
+    scheduler.submit(Move(**move))
 
 
+async def finish_scenario(scenario_id: int):
+    async with async_session() as session:
+        scenario_db = await ScenarioRepository.get_scenario(session, scenario_id)
+        scenario_db.status = ScenarioStatus.FINISHED
+        await session.commit()
+    await node.release(scenario_id)
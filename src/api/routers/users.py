@@ -1,7 +1,8 @@
 from db.user_repository import UserRepository
 from fastapi import APIRouter, Depends, HTTPException
-from auth.auth import get_current_admin
+from auth.auth import get_current_admin, principal_cache
 from auth.schemas import AddUser, User as SUser
+from cluster import node
 
 
 router = APIRouter(
@@ -21,12 +22,22 @@ async def register(user: AddUser, creator=Depends(get_current_admin)):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    await invalidate_principal(user.username)  # a removed user may have been recreated under the same name
     return user
 
 
 @router.delete('/{user_id}')
 async def remove_user(user_id: int, remover=Depends(get_current_admin)):
-    await UserRepository.remove_user(user_id)
+    if removed := await UserRepository.remove_user(user_id):
+        await invalidate_principal(removed.username)
     return {}
 
 
+async def invalidate_principal(username: str):
+    principal_cache.invalidate(username)
+    await node.publish(None, "users.changed", username=username)
+
+
+@node.handler("users.changed")  # user changed through another node
+async def on_user_changed(scenario_id, username: str):
+    principal_cache.invalidate(username)
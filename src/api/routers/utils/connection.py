@@ -1,37 +1,209 @@
+import asyncio
+from collections import deque
+
+import orjson
+
+from constants import Constants
+from plot.delta import DeltaEncoder
+from plot.lod import lod_map
+from sim.logger import to_serializable
+
+CLOSE = object()  # sentinel in the send queue
+
+
+def dumps(data) -> str:
+    return orjson.dumps(data,
+                        default=to_serializable,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+
+class Client:
+    '''
+    Connected websocket with its own bounded send queue and sender task.
+    Frames are droppable: when the client lags behind, stale frames are dropped
+    instead of blocking the scenario. Personal messages and close are never dropped.
+    '''
+
+    def __init__(self, websocket, protocol="json", vehicle_id=None, lod=0, max_pending=Constants.RealTime.WS_SEND_QUEUE):
+        self.websocket = websocket
+        self.vehicle_id = vehicle_id
+        self.lod = lod  # level of detail of the map sent to the client, finer tiles are fetched from /maps
+        self.encoder = DeltaEncoder() if protocol == "delta" else None
+        self.max_pending = max_pending
+        self.pending = deque()  # (text | CLOSE, droppable)
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.alive = True
+        self.task = asyncio.create_task(self.sender())
+
+    def prepare(self, data: dict, lods: dict) -> dict:
+        '''
+        Frame with the map at the client's level of detail (lods caches levels for one broadcast)
+        '''
+        plt = data.get("plt") if isinstance(data, dict) else None
+        if not self.lod or not plt or not plt.get("map"):
+            return data
+        if self.lod not in lods:
+            lods[self.lod] = lod_map(plt["map"], self.lod)
+        return {**data, "plt": {**plt, "map": lods[self.lod]}}
+
+    def encode(self, data: dict, lods: dict) -> str:
+        data = self.prepare(data, lods)
+        return dumps(self.encoder.encode(data) if self.encoder else data)
+
+    def push_frame(self, data: dict, lods: dict, text: str = None):
+        '''
+        Push a broadcast frame (text - already encoded for plain JSON clients of the level).
+        Frames carrying the map or static data are sent only once, so they are never dropped
+        '''
+        plt = data.get("plt") if isinstance(data, dict) else None
+        keep = bool(plt and plt.get("map"))
+        if self.encoder:
+            message = self.encoder.encode(self.prepare(data, lods))
+            keep = keep or "static" in message
+            text = dumps(message)
+        elif text is None:
+            text = self.encode(data, lods)
+        self.push(text, droppable=not keep)
+
+    def is_lagging(self):
+        return len(self.pending) >= self.max_pending
+
+    def drop_frames(self):
+        kept = deque(item for item in self.pending if not item[1])
+        self.dropped += len(self.pending) - len(kept)
+        self.pending = kept
+        if self.encoder:  # deltas after a gap are useless => restart with a keyframe
+            self.encoder.force_keyframe()
+
+    def push(self, item, droppable=True):
+        self.pending.append((item, droppable))
+        self.wakeup.set()
+
+    async def sender(self):
+        try:
+            while True:
+                while not self.pending:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+
+                item, _ = self.pending.popleft()
+                if item is CLOSE:
+                    await self.websocket.close(code=1008)
+                    return
+                await self.websocket.send_text(item)
+        except Exception:
+            pass
+        finally:
+            self.alive = False
+
+    async def close(self):
+        self.push(CLOSE, droppable=False)
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task), Constants.RealTime.WS_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+            try:
+                await self.websocket.close(code=1008)
+            except Exception:
+                pass
+
+
 class ConnectionManager:
     def __init__(self):
         self.clients = {}
 
-    async def connect(self, scenario_id: int, token, websocket):
+    async def connect(self, scenario_id: int, token, websocket, protocol: str = "json", vehicle_id: int = None,
+                      lod: int = 0):
         await websocket.accept(subprotocol=token)
         if not scenario_id in self.clients:
             self.clients[scenario_id] = []
-        self.clients[scenario_id].append(websocket)
+        self.clients[scenario_id].append(Client(websocket, protocol, vehicle_id, lod))
+
+    def get_client(self, scenario_id: int, websocket):
+        for client in self.clients.get(scenario_id, []):
+            if client.websocket is websocket:
+                return client
+        return None
 
     async def disconnect(self, scenario_id: int, websocket):
-        self.clients[scenario_id].remove(websocket)
-        await websocket.close(code=1008)
+        client = self.get_client(scenario_id, websocket)
+        if client:
+            self.clients[scenario_id].remove(client)
+            await client.close()
+
+    async def disconnect_vehicle(self, scenario_id: int, vehicle_id: int, message: dict = None):
+        '''
+        Send a last personal message to all connections driving the vehicle and close them
+        '''
+        lods = {}
+        for client in [c for c in self.clients.get(scenario_id, []) if c.vehicle_id == vehicle_id]:
+            if message is not None:
+                client.push(client.encode(message, lods), droppable=False)
+            self.clients[scenario_id].remove(client)
+            client.push(CLOSE, droppable=False)  # closed by its sender task once flushed
+
+    def connected_vehicles(self, scenario_id: int):
+        return {c.vehicle_id for c in self.clients.get(scenario_id, []) if c.alive and c.vehicle_id is not None}
+
+    async def send_to_vehicle(self, scenario_id: int, vehicle_id: int, data: dict):
+        '''
+        Personal message to all connections of the vehicle, returns False if none is connected
+        '''
+        clients = [c for c in self.clients.get(scenario_id, []) if c.vehicle_id == vehicle_id and c.alive]
+        if not clients:
+            return False
+        text = dumps(data)
+        for client in clients:
+            client.push(text, droppable=False)
+        return True
 
     def count_connections(self, scenario_id: int):
         return len(self.clients.get(scenario_id, []))
-        
+
 
     async def send_personal_message(self, data: dict, websocket):
-        await websocket.send_json(data)
+        for clients in self.clients.values():
+            for client in clients:
+                if client.websocket is websocket:
+                    client.push(client.encode(data, {}), droppable=False)
+                    return
+        await websocket.send_text(dumps(data))
 
     async def broadcast(self, scenario_id: int, message: str):
-        for connection in self.clients.get(scenario_id, []):
-            await connection.send_text(message)
+        for client in self.clients.get(scenario_id, []):
+            client.push(message)
 
     async def broadcast_json(self, scenario_id: int, data: dict):
-        connections = self.clients.get(scenario_id, [])
-        for connection in connections[:]: # iterate over a copy
-            try:
-                await connection.send_json(data)
-            except Exception as e:
-                connections.remove(connection)
+        clients = self.clients.get(scenario_id, [])
+        texts = {}  # lod -> frame encoded once for all plain JSON clients of the level
+        lods = {}
+
+        for client in clients[:]: # iterate over a copy
+            if not client.alive:
+                clients.remove(client)
+                continue
+
+            if client.is_lagging():
+                client.drop_frames()
+
+            if client.encoder:
+                client.push_frame(data, lods)
+            else:
+                if client.lod not in texts:
+                    texts[client.lod] = client.encode(data, lods)
+                client.push_frame(data, lods, texts[client.lod])
 
     async def close_all(self, scenario_id: int):
-        for connection in self.clients.get(scenario_id, []):
-            await connection.close(code=1008)
+        clients = self.clients.get(scenario_id, [])
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
         self.clients[scenario_id] = []
+
+    def stats(self):
+        clients = [c for clients in self.clients.values() for c in clients]
+        return {
+            "scenarios": len([s for s, c in self.clients.items() if c]),
+            "clients": len(clients),
+            "pending": sum(len(c.pending) for c in clients),
+            "dropped": sum(c.dropped for c in clients),
+        }
@@ -0,0 +1,52 @@
+class FanoutConnections:
+    '''
+    ConnectionManager facade used by the owner node of a scenario.
+    Messages are sent to the local connections and, only if another node holds connections
+    of the scenario (see attach), published to the other nodes, which deliver them to their connections.
+    '''
+
+    def __init__(self, local, node, name: str):
+        self.local = local
+        self.node = node
+        self.op = f"{name}.connections"
+        self.remote = {}  # scenario_id -> {node_id: connections}, nodes other than this one
+        node.handler(self.op)(self.deliver)
+
+    def attach(self, scenario_id: int, node_id: str):
+        if node_id != self.node.node_id:
+            nodes = self.remote.setdefault(scenario_id, {})
+            nodes[node_id] = nodes.get(node_id, 0) + 1
+
+    def detach(self, scenario_id: int, node_id: str):
+        nodes = self.remote.get(scenario_id, {})
+        if nodes.get(node_id, 0) > 1:
+            nodes[node_id] -= 1
+        else:
+            nodes.pop(node_id, None)
+        if not nodes:
+            self.remote.pop(scenario_id, None)
+
+    async def publish(self, scenario_id: int, **payload):
+        if self.remote.get(scenario_id):  # frames of a scenario watched only locally never reach the broker
+            await self.node.publish(scenario_id, self.op, **payload)
+
+    async def broadcast_json(self, scenario_id: int, data: dict):
+        await self.local.broadcast_json(scenario_id, data)
+        await self.publish(scenario_id, method="broadcast_json", data=data)
+
+    async def disconnect_vehicle(self, scenario_id: int, vehicle_id: int, message: dict = None):
+        await self.local.disconnect_vehicle(scenario_id, vehicle_id, message)
+        await self.publish(scenario_id, method="disconnect_vehicle", vehicle_id=vehicle_id, message=message)
+
+    async def close_all(self, scenario_id: int):
+        await self.local.close_all(scenario_id)
+        await self.publish(scenario_id, method="close_all")
+        self.remote.pop(scenario_id, None)
+
+    async def deliver(self, scenario_id: int, method: str, data=None, vehicle_id=None, message=None):
+        if method == "broadcast_json":
+            await self.local.broadcast_json(scenario_id, data)
+        elif method == "disconnect_vehicle":
+            await self.local.disconnect_vehicle(scenario_id, vehicle_id, message)
+        elif method == "close_all":
+            await self.local.close_all(scenario_id)
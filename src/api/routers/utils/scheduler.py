@@ -0,0 +1,124 @@
+import asyncio
+import logging
+
+from schemas.results import Tick
+from plot.renderer import Renderer
+from settings import settings
+
+
+class TickScheduler:
+    '''
+    Steps realtime scenarios at a fixed rate, independent of websocket traffic.
+
+    Players only submit inputs; once per tick the latest input of every player is merged into
+    one env step and the resulting frame is broadcast once to all connections of the scenario.
+    Players without input in a tick keep still (KEEP_ALIVE).
+    A scenario without connected players is paused until one joins again, after
+    idle_timeout seconds it is finished and its worker is stopped.
+    '''
+
+    def __init__(self, sim_manager, connections, rate: float = None, idle_timeout: float = None):
+        self.sim_manager = sim_manager
+        self.connections = connections
+        self.rate = rate or settings.realtime_tick_rate
+        self.idle_timeout = idle_timeout or settings.realtime_idle_timeout
+        self.inputs = {}  # scenario_id -> {vehicle_id: Move}
+        self.map_requests = set()
+        self.tasks = {}
+        self.players = {}  # scenario_id -> {vehicle_id: open connections}, on all nodes
+
+    def join(self, scenario_id: int, vehicle_id: int):
+        players = self.players.setdefault(scenario_id, {})
+        players[vehicle_id] = players.get(vehicle_id, 0) + 1
+
+    def leave(self, scenario_id: int, vehicle_id: int):
+        players = self.players.get(scenario_id, {})
+        if players.get(vehicle_id, 0) > 1:
+            players[vehicle_id] -= 1
+        else:
+            players.pop(vehicle_id, None)
+
+    def has_players(self, scenario_id: int):
+        return bool(self.players.get(scenario_id))
+
+    def submit(self, move):
+        self.inputs.setdefault(move.scenario_id, {})[move.vehicle_id] = move
+
+    def request_map(self, scenario_id: int):
+        self.map_requests.add(scenario_id)
+
+    def is_running(self, scenario_id: int):
+        return scenario_id in self.tasks
+
+    def start(self, scenario_id: int, on_finish=None):
+        if self.is_running(scenario_id):
+            return
+        self.tasks[scenario_id] = asyncio.create_task(self.run(scenario_id, on_finish))
+
+    def next_tick(self, scenario_id: int) -> Tick:
+        moves = list(self.inputs.pop(scenario_id, {}).values())
+        timestamps = [move.timestamp for move in moves if move.timestamp]
+        send_map = scenario_id in self.map_requests
+        self.map_requests.discard(scenario_id)
+        return Tick(scenario_id=scenario_id,
+                    moves=moves,
+                    timestamp=max(timestamps) if timestamps else None,
+                    send_map=send_map)
+
+    async def run(self, scenario_id: int, on_finish=None):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        deadline = loop.time()
+        idle_since = None
+        renderer = Renderer()
+
+        try:
+            while True:
+                if not self.has_players(scenario_id):  # nobody is watching => do not simulate
+                    self.inputs.pop(scenario_id, None)
+                    idle_since = idle_since or loop.time()
+                    if loop.time() - idle_since >= self.idle_timeout:  # abandoned
+                        logging.info(f"Scenario {scenario_id} has no players for {self.idle_timeout} s, stopping")
+                        await self.sim_manager.stop_worker(scenario_id)
+                        await self.connections.close_all(scenario_id)
+                        if on_finish:
+                            await on_finish(scenario_id)
+                        return
+                    deadline = loop.time() + interval
+                    await asyncio.sleep(interval)
+                    continue
+                idle_since = None
+
+                tick = self.next_tick(scenario_id)
+                state = await self.sim_manager.process_move(tick)
+                data = renderer.get_rendering_data(state, tick.timestamp)
+
+                if state['status'] == "FINISHED":
+                    await self.connections.broadcast_json(scenario_id, data)
+                    await self.connections.close_all(scenario_id)
+                    if on_finish:
+                        await on_finish(scenario_id)
+                    return
+
+                for vehicle_id, reason in state.get('terminated', {}).items():
+                    logging.info(f"Vehicle {vehicle_id} terminated in scenario {scenario_id}")
+                    personal = renderer.get_rendering_data({**state, 'status': "TERMINATED", 'reason': reason},
+                                                           tick.timestamp)
+                    await self.connections.disconnect_vehicle(scenario_id, vehicle_id, personal)
+
+                await self.connections.broadcast_json(scenario_id, data)
+
+                deadline += interval
+                delay = deadline - loop.time()
+                if delay < 0:  # simulation is slower than the rate => do not try to catch up
+                    deadline = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
+        except Exception:
+            logging.exception(f"Tick loop of scenario {scenario_id} failed")
+            await self.connections.close_all(scenario_id)
+        finally:
+            self.tasks.pop(scenario_id, None)
+            self.inputs.pop(scenario_id, None)
+            self.map_requests.discard(scenario_id)
+            self.players.pop(scenario_id, None)
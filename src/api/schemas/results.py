@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Literal
 
 from pydantic import BaseModel, Field
 from schemas.maps import Map
@@ -20,6 +20,9 @@ class ScenarioBase(BaseModel):
     vehicles: List[Vehicle]
     map: int
     is_offline: bool = False
+    # which steps of an offline turn are sent to the client, see sim/frames.py
+    frame_policy: Literal["all", "every_k", "events", "adaptive"] = "all"
+    frame_stride: int = Field(1, ge=1)
 
 
 class Scenario(ScenarioBase):
@@ -39,6 +42,26 @@ class Move(BaseModel):
     sens_acceleration: Optional[float] = Constants.RealTime.MOVE_ACCELERATION_SENSITIVITY
     sens_steering: Optional[float] = Constants.RealTime.MOVE_STEERING_SENSITIVITY
 
+class Tick(BaseModel):
+    '''
+    One realtime simulation step: latest move of every player who sent one since the previous tick
+    '''
+    scenario_id: int
+    moves: List[Move] = []
+    timestamp: Optional[int] = None
+    send_map: bool = False
+
+    def direction(self):
+        '''
+        Direction of the latest move of the tick, logged as "move" of the step
+        '''
+        if not self.moves:
+            return "KEEP_ALIVE"
+        return max(self.moves, key=lambda move: move.timestamp or 0).direction
+
+    def directions(self):
+        return {move.vehicle_id: move.direction for move in self.moves}
+
 class SimulationTask(BaseModel):
     id: int
     scenario: Scenario
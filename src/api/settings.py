@@ -1,10 +1,15 @@
 from pydantic_settings import BaseSettings
+from pydantic import Field
 from pathlib import Path
+import os
+import socket
 
 class Settings(BaseSettings):
     SECRET_KEY: str = "DEBUG"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    principal_cache_ttl: float = 30.0  # seconds a user resolved from a token is reused, 0 disables
+    password_hash_workers: int = 2  # threads hashing / verifying passwords, bounds CPU spent on login bursts
     app_name: str = "MetaSimulator API"
     host: str = "0.0.0.0"
     port: int = 8000
@@ -19,6 +24,29 @@ class Settings(BaseSettings):
     logs_folder: str = "logs"
     default_user_name: str = "admin"
     default_user_password: str = "admin"
+    realtime_tick_rate: float = 10.0  # realtime scenario steps per second
+    realtime_idle_timeout: float = 60.0  # seconds without players before a realtime scenario is finished
+    log_chunk_steps: int = 100  # steps buffered in memory before the log is appended to disk
+    log_fsync: bool = True  # fsync log files on every chunk
+    log_export_json: bool = False  # also write the legacy JSON log when scenario finishes
+    worker_pool_size: int = 2  # pre-spawned simulation processes kept idle
+    frame_ring_slots: int = 2048  # max frames in the shared memory ring of an offline worker (else scenario steps + 1)
+    frame_ring_agents: int = 64  # max agents per frame in the ring (else scenario vehicles), larger turns go through the pipe
+    memory_cache_bytes: int = 64 * 1024 * 1024  # in-memory tier above the map and offline blob caches
+    api_workers: int = 1  # uvicorn worker processes, more than one needs the amqp broker
+    broker: str = "memory"  # "memory" (single process) | "amqp" (several processes / hosts)
+    rq_host: str = "localhost"
+    rq_port: int = 5672
+    broker_timeout: float = 30.0  # seconds to wait for the owner node of a scenario
+    db_pool_size: int = 10  # connections kept open per API process
+    db_max_overflow: int = 20  # extra connections opened under load
+    db_pool_timeout: float = 30.0  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # seconds before a connection is replaced, -1 to never
+    db_pool_pre_ping: bool = True  # check connections on checkout (survives Postgres restarts)
+    db_statement_cache_size: int = 100  # asyncpg prepared statements per connection, 0 behind pgbouncer
+    node_heartbeat: float = 10.0  # seconds between heartbeats of a node
+    node_expiry: float = 30.0  # seconds without heartbeat after which the scenarios of a node are re-claimed
+    node_id: str = Field(default_factory=lambda: f"{socket.gethostname()}-{os.getpid()}")
 
 
     @property
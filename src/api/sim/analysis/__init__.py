@@ -0,0 +1,2 @@
+from .loader import find_logs, load_states
+from .metrics import gap_series, ttc_series, arrival_rate, crash_rate, med, summary
@@ -0,0 +1,122 @@
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from settings import settings
+from sim.logger import LogReader, get_flags
+
+LOG_META_RE = re.compile(r"^(?P<prefix>.*)scenario_(?P<id>\d+)\.meta\.json$")
+LOG_JSON_RE = re.compile(r"^(?P<prefix>.*)scenario_(?P<id>\d+)\.json$")
+BATCH_PREFIX_RE = re.compile(r"^batch_(?P<job>\d+)_$")  # logs of batch.py jobs
+
+COLUMNS = ["step", "x", "y", "vx", "vy", "heading", "flags", "is_human"]
+
+
+def find_logs(log_dir: Path = None) -> dict:
+    '''
+    Returns {(prefix, scenario_id): is_binary} for every log in the logs dir
+    (batch runs write several logs of one scenario under different prefixes).
+    Binary (streamed) logs win over JSON exports of the same log.
+    '''
+    log_dir = Path(log_dir or settings.logs_dir)
+    found = {}
+    for path in log_dir.glob("*scenario_*.json"):
+        if match := LOG_JSON_RE.match(path.name):
+            found.setdefault((match["prefix"] or None, int(match["id"])), False)
+    for path in log_dir.glob("*scenario_*.meta.json"):
+        if match := LOG_META_RE.match(path.name):
+            found[(match["prefix"] or None, int(match["id"]))] = True
+    return found
+
+
+def batch_job(prefix):
+    match = BATCH_PREFIX_RE.match(prefix or "")
+    return int(match["job"]) if match else None
+
+
+def binary_frame(scenario_id: int, prefix=None, log_dir: Path = None) -> pd.DataFrame:
+    reader = LogReader(scenario_id, prefix, log_dir)
+
+    meta = reader.meta()
+    states = reader.states(meta)
+    agents = np.array(meta["agents"], dtype=object)
+    humans = np.array([meta["humans"][aid] for aid in meta["agents"]], dtype=bool)
+
+    return pd.DataFrame({
+        "scenario_id": np.full(len(states), scenario_id, dtype=np.int64),
+        "agent": agents[states["agent"]] if len(agents) else np.array([], dtype=object),
+        "t": states["entry"].astype(np.int64),
+        "step": states["step"],
+        "x": states["x"],
+        "y": states["y"],
+        "vx": states["vx"],
+        "vy": states["vy"],
+        "heading": states["heading"],
+        "flags": states["flags"],
+        "is_human": humans[states["agent"]] if len(humans) else np.array([], dtype=bool),
+    })
+
+
+def json_frame(scenario_id: int, prefix=None, log_dir: Path = None) -> pd.DataFrame:
+    '''
+    Loader for JSON logs (exports and logs written before streaming logger)
+    '''
+    log_dir = Path(log_dir or settings.logs_dir)
+    name = f"{prefix or ''}scenario_{scenario_id}.json"
+    with open(log_dir / name, "r") as f:
+        data = json.load(f)
+
+    columns = {key: [] for key in ["agent", "t", *COLUMNS]}
+    for t, entry in enumerate(data):
+        info = entry.get("info") or {}
+        for agent_id, state in entry["positions"].items():
+            (x, y), (vx, vy) = state["position"], state["velocity"]
+            columns["agent"].append(agent_id)
+            columns["t"].append(t)
+            columns["step"].append(entry["step"])
+            columns["x"].append(x)
+            columns["y"].append(y)
+            columns["vx"].append(vx)
+            columns["vy"].append(vy)
+            columns["heading"].append(state["heading"])
+            columns["flags"].append(get_flags(info.get(agent_id) or {}))
+            columns["is_human"].append(state.get("is_human", False))
+
+    frame = pd.DataFrame(columns)
+    frame.insert(0, "scenario_id", scenario_id)
+    return frame
+
+
+def load_states(scenario_ids=None, log_dir: Path = None, batch=False) -> pd.DataFrame:
+    '''
+    Load agent states of many scenarios into one columnar frame
+    indexed by (scenario_id, agent, t), where t is the env step ordinal in the log.
+    Columns: step, x, y, vx, vy, heading, flags (sim.logger.FLAG_*), is_human, offline
+
+    batch=True loads the logs of batch.py jobs instead of the API ones: every job is a
+    separate run of its scenario, so the scenario_id level holds the job index and the
+    scenario id moves to the "scenario" column. scenario_ids always filters by scenario id.
+    '''
+    logs = {key: is_binary for key, is_binary in find_logs(log_dir).items()
+            if (batch_job(key[0]) is not None) == batch}
+    if scenario_ids is not None:
+        logs = {key: is_binary for key, is_binary in logs.items() if key[1] in scenario_ids}
+
+    frames = []
+    for (prefix, scenario_id), is_binary in sorted(logs.items(), key=lambda item: (item[0][1], item[0][0] or "")):
+        load = binary_frame if is_binary else json_frame
+        frame = load(scenario_id, prefix, log_dir)
+        frame["offline"] = prefix == "offline" or batch
+        if batch:
+            frame["scenario"] = scenario_id
+            frame["scenario_id"] = batch_job(prefix)
+        frames.append(frame)
+
+    if not frames:
+        empty = pd.DataFrame(columns=["scenario_id", "agent", "t", *COLUMNS, "offline"])
+        return empty.set_index(["scenario_id", "agent", "t"])
+
+    return pd.concat(frames, ignore_index=True).set_index(["scenario_id", "agent", "t"]).sort_index()
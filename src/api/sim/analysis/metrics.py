@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from sim.logger import FLAG_ARRIVE_DEST, FLAG_CRASH
+
+STEP_DT = 0.1  # seconds per env step (physics step 0.02 s x decision repeat 5)
+COLLISION_DISTANCE = 4.5  # centre distance at which two vehicles are considered touching [m]
+
+
+def to_tensor(frame: pd.DataFrame, columns=("x", "y")):
+    '''
+    Turn one scenario of a load_states() frame into a dense array [t, agent, column].
+    Missing agents (terminated / not spawned yet) are NaN.
+    Returns (array, t_index, agent_index)
+    '''
+    wide = frame[list(columns)].unstack("agent")
+    agents = wide.columns.get_level_values("agent").unique()
+    array = np.stack([wide[col].reindex(columns=agents).to_numpy(dtype=np.float64) for col in columns], axis=-1)
+    return array, wide.index, agents
+
+
+def pairwise_distances(pos: np.ndarray) -> np.ndarray:
+    '''
+    pos [t, agent, 2] -> distances [t, agent, agent], inf on diagonal
+    '''
+    diff = pos[:, :, None, :] - pos[:, None, :, :]
+    dist = np.sqrt((diff ** 2).sum(-1))
+    idx = np.arange(pos.shape[1])
+    dist[:, idx, idx] = np.inf
+    return dist
+
+
+def gap_series(frame: pd.DataFrame) -> pd.Series:
+    '''
+    Minimum centre distance between any two vehicles, per (scenario_id, t)
+    '''
+    result = []
+    for scenario_id, scenario in frame.groupby(level="scenario_id"):
+        pos, t_index, _ = to_tensor(scenario.droplevel("scenario_id"))
+        dist = pairwise_distances(pos)
+        gaps = np.where(np.isnan(dist), np.inf, dist).min(axis=(1, 2))
+        result.append(pd.Series(gaps, index=pd.MultiIndex.from_product([[scenario_id], t_index], names=["scenario_id", "t"])))
+    return pd.concat(result) if result else pd.Series(dtype=float)
+
+
+def ttc_series(frame: pd.DataFrame) -> pd.Series:
+    '''
+    Minimum time-to-collision [s] between any two vehicles per (scenario_id, t),
+    assuming constant velocities. inf if no pair is closing in.
+    '''
+    result = []
+    for scenario_id, scenario in frame.groupby(level="scenario_id"):
+        state, t_index, _ = to_tensor(scenario.droplevel("scenario_id"), ("x", "y", "vx", "vy"))
+        pos, vel = state[..., :2], state[..., 2:]
+
+        rel_pos = pos[:, None, :, :] - pos[:, :, None, :]  # j relative to i
+        rel_vel = vel[:, None, :, :] - vel[:, :, None, :]
+        dist = np.sqrt((rel_pos ** 2).sum(-1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            closing = -(rel_pos * rel_vel).sum(-1) / dist
+            ttc = np.where(closing > 0, np.maximum(dist - COLLISION_DISTANCE, 0) / closing, np.inf)
+        ttc = np.where(np.isnan(ttc), np.inf, ttc)
+        result.append(pd.Series(ttc.min(axis=(1, 2)), index=pd.MultiIndex.from_product([[scenario_id], t_index], names=["scenario_id", "t"])))
+    return pd.concat(result) if result else pd.Series(dtype=float)
+
+
+def arrival_rate(frame: pd.DataFrame) -> pd.Series:
+    '''
+    Share of human agents that reached their destination, per scenario
+    '''
+    humans = frame[frame["is_human"].astype(bool)]
+    arrived = (humans["flags"].astype(np.uint8) & FLAG_ARRIVE_DEST).astype(bool)
+    return arrived.groupby(level=["scenario_id", "agent"]).any().groupby(level="scenario_id").mean()
+
+
+def crash_rate(frame: pd.DataFrame) -> pd.Series:
+    humans = frame[frame["is_human"].astype(bool)]
+    crashed = (humans["flags"].astype(np.uint8) & FLAG_CRASH).astype(bool)
+    return crashed.groupby(level=["scenario_id", "agent"]).any().groupby(level="scenario_id").mean()
+
+
+def med(frame: pd.DataFrame, reference: int, agent: str = "agent0") -> pd.Series:
+    '''
+    Mean Euclidean Distance between the agent trajectory of every scenario and
+    of the reference scenario, aligned by step and cut to the shorter one.
+    Empty (NaN once joined to the summary) if the agent or the reference is not logged.
+    '''
+    if agent not in frame.index.get_level_values("agent"):
+        return pd.Series(dtype=float)
+    traj = frame.xs(agent, level="agent")[["x", "y"]]
+    wide = traj.unstack("scenario_id")  # t x (coord, scenario)
+    if reference not in wide["x"].columns:
+        return pd.Series(dtype=float)
+    dx = wide["x"].sub(wide["x"][reference], axis=0)
+    dy = wide["y"].sub(wide["y"][reference], axis=0)
+    return np.sqrt(dx ** 2 + dy ** 2).mean(skipna=True).drop(reference)
+
+
+def summary(frame: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Aggregated metrics per scenario
+    '''
+    if frame.empty:
+        return pd.DataFrame()
+
+    grouped = frame.groupby(level="scenario_id")
+    gaps = gap_series(frame).groupby(level="scenario_id")
+    ttc = ttc_series(frame).groupby(level="scenario_id")
+
+    result = pd.DataFrame({
+        "offline": grouped["offline"].first(),
+        "steps": grouped.apply(lambda f: f.index.get_level_values("t").nunique()),
+        "agents": grouped.apply(lambda f: f.index.get_level_values("agent").nunique()),
+        "arrival_rate": arrival_rate(frame),
+        "crash_rate": crash_rate(frame),
+        "min_gap": gaps.min(),
+        "min_ttc": ttc.min(),
+    })
+    if "scenario" in frame:  # batch runs (see load_states)
+        result.insert(0, "scenario", grouped["scenario"].first())
+    return result
@@ -0,0 +1,149 @@
+import numpy as np
+
+FIELDS = ["x", "y", "vx", "vy", "heading"]
+POLICIES = ["all", "every_k", "events", "adaptive"]
+
+
+class FrameSampler:
+    '''
+    Decides which simulated steps of an offline turn are sent to the client.
+        all      - every step
+        every_k  - every `stride`-th step
+        events   - steps where any agent changes its action
+        adaptive - steps where heading or speed of any agent changed noticeably
+                   since the last kept frame (but at least every `stride` steps)
+    The last step of a turn is always kept, so the client ends in the exact state.
+    '''
+
+    def __init__(self, policy="all", stride=1, heading_threshold=0.05, speed_threshold=0.5):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown frame policy {policy}")
+        self.policy = policy
+        self.stride = max(1, stride or 1)
+        self.heading_threshold = heading_threshold
+        self.speed_threshold = speed_threshold
+
+    def keep(self, ind, row, last_row, since_kept, event=False):
+        '''
+        ind - step index in the turn, row - packed state of the step,
+        last_row - packed state of the last kept frame, since_kept - steps since it
+        '''
+        if self.policy == "all" or last_row is None:
+            return True
+        if self.policy == "every_k":
+            return ind % self.stride == 0
+        if self.policy == "events":
+            return event
+
+        # adaptive
+        if since_kept >= self.stride and self.stride > 1:
+            return True
+        heading = np.abs(np.angle(np.exp(1j * (row[:, 4] - last_row[:, 4]))))
+        speed = np.abs(np.hypot(row[:, 2], row[:, 3]) - np.hypot(last_row[:, 2], last_row[:, 3]))
+        return bool(np.nanmax(heading, initial=0) > self.heading_threshold
+                    or np.nanmax(speed, initial=0) > self.speed_threshold)
+
+
+class FramePacker:
+    '''
+    Collects sampled frames of a turn into packed float arrays:
+    {
+        "format": "packed",
+        "agents": [agent_id, ...],
+        "fields": ["x", "y", "vx", "vy", "heading"],
+        "steps": [i, ...],                      # step index in the turn of every frame
+        "data": [...],                          # frames x agents x fields, flattened, null if agent missing
+        "humans": [agent_id, ...],
+        "goals": {agent_id: goal},
+        "interpolate": "linear" | null          # client hint for the dropped steps
+    }
+    '''
+
+    def __init__(self, sampler: FrameSampler):
+        self.sampler = sampler
+        self.agents = None
+        self.index = {}
+        self.humans = []
+        self.goals = {}
+        self.steps = []
+        self.rows = []
+        self.pending = None  # last seen, not kept frame
+        self.since_kept = 0
+
+    def to_row(self, states):
+        '''
+        states - AgentStates of the step (sim/state.py)
+        '''
+        if self.agents is None:
+            self.agents = list(states.ids)
+            self.index = {aid: ind for ind, aid in enumerate(self.agents)}
+            self.humans = [aid for aid, is_human in zip(states.ids, states.humans.tolist()) if is_human]
+            self.goals = {aid: goal for aid, goal in states.goals.items() if goal and aid in self.index}
+
+        if states.ids == self.agents:  # same agents as the first frame
+            return states.array.astype(np.float32)
+
+        row = np.full((len(self.agents), len(FIELDS)), np.nan, dtype=np.float32)
+        for ind, aid in enumerate(states.ids):
+            if (col := self.index.get(aid)) is not None:
+                row[col] = states.array[ind]
+        return row
+
+    def add(self, ind, states, event=False):
+        row = self.to_row(states)
+        last_row = self.rows[-1] if self.rows else None
+        self.since_kept += 1
+
+        if self.sampler.keep(ind, row, last_row, self.since_kept, event):
+            self.steps.append(ind)
+            self.rows.append(row)
+            self.pending = None
+            self.since_kept = 0
+        else:
+            self.pending = (ind, row)
+
+    def pack(self, ring=None):
+        '''
+        With a FrameRing the rows are written to shared memory and only their
+        location is returned in "shm" (see SimulationManager.attach_frames)
+        '''
+        if self.pending:
+            ind, row = self.pending
+            self.steps.append(ind)
+            self.rows.append(row)
+            self.pending = None
+
+        packed = {
+            "format": "packed",
+            "agents": self.agents or [],
+            "fields": FIELDS,
+            "steps": self.steps,
+            "data": [],
+            "humans": self.humans,
+            "goals": self.goals,
+            "interpolate": None if self.sampler.policy == "all" else "linear",
+        }
+        if not self.rows:
+            return packed
+
+        rows = np.stack(self.rows)
+        if ring is not None and ring.fits(rows):
+            packed["data"] = None
+            packed["shm"] = {"offset": ring.write(rows), "count": len(rows)}
+        else:
+            packed["data"] = to_json_data(rows)
+        return packed
+
+
+def to_json_data(rows):
+    data = np.round(rows.astype(np.float64), 3).ravel().tolist()  # float32 would print its noise
+    return [None if v != v else v for v in data]  # NaN => null
+
+
+def frames_to_json(frames):
+    '''
+    Packed frames with data still as an array (read from a FrameRing) => JSON-ready dict
+    '''
+    if isinstance(frames, dict) and isinstance(frames.get("data"), np.ndarray):
+        return {**frames, "data": to_json_data(frames["data"])}
+    return frames
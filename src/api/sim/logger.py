@@ -1,19 +1,103 @@
 import os
 import json
 import numpy as np
+from pathlib import Path
 from settings import settings
 
 
+LOG_VERSION = 2  # meta["version"], logs without it are version 1
+
+# One record per agent per step, appended to <name>.states.bin
+STATE_DTYPE = np.dtype([
+    ("entry", "<u4"),  # line number in <name>.events.jsonl
+    ("step", "<i4"),
+    ("agent", "<u2"),  # index into meta["agents"]
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("vx", "<f4"),
+    ("vy", "<f4"),
+    ("heading", "<f4"),
+    ("flags", "u1"),  # FLAG_* bits taken from agent info (since version 2)
+])
+STATE_DTYPE_V1 = np.dtype([(name, STATE_DTYPE.fields[name][0]) for name in STATE_DTYPE.names if name != "flags"])
+
+FLAG_CRASH = 1
+FLAG_OUT_OF_ROAD = 2
+FLAG_ARRIVE_DEST = 4
+
+
+def get_flags(agent_info: dict) -> int:
+    flags = 0
+    if agent_info.get("crash") or agent_info.get("crash_vehicle"):
+        flags |= FLAG_CRASH
+    if agent_info.get("out_of_road"):
+        flags |= FLAG_OUT_OF_ROAD
+    if agent_info.get("arrive_dest"):
+        flags |= FLAG_ARRIVE_DEST
+    return flags
+
+
+def to_serializable(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.bool_):
+        return bool(obj)
+    elif isinstance(obj, tuple):
+        return list(obj)
+    return obj
+
+
+def get_log_name(scenario_id, prefix=None):
+    name = f"scenario_{scenario_id}"
+    return prefix + name if prefix else name
+
 
 class Logger:
+    '''
+    Streaming, append-only scenario logger.
+
+    Agent states are buffered as fixed-dtype records and everything else (move, termination,
+    truncation, info) as JSON lines. Every `log_chunk_steps` steps the buffers are appended to
+    disk and fsynced, so memory stays bounded and a crashed worker loses at most one chunk.
+    Files (in logs dir):
+        <name>.states.bin    - STATE_DTYPE records
+        <name>.events.jsonl  - one line per step
+        <name>.meta.json     - agent ids, humans, goals, number of steps
+    '''
     def __init__(self, scenario_id, prefix=None):
         self.scenario_id = scenario_id
-        self.logs = []
         self.log_dir = settings.logs_dir
         self.prefix = prefix
+        self.chunk_steps = settings.log_chunk_steps
+        self.agents = {}  # agent_id -> index
+        self.humans = {}
+        self.goals = {}
+        self.records = []
+        self.events = []
+        self.steps = 0
+        self.started = False
         os.makedirs(self.log_dir, exist_ok=True)
 
-    def add_entry(self, step_num, move_direction, agent_states, termination, truncation, info):
+    def get_path(self, suffix):
+        return self.log_dir / f"{get_log_name(self.scenario_id, self.prefix)}.{suffix}"
+
+    def agent_index(self, agent_id, is_human, goal):
+        if agent_id not in self.agents:
+            self.agents[agent_id] = len(self.agents)
+            self.humans[agent_id] = bool(is_human)
+            if goal:
+                self.goals[agent_id] = goal
+        return self.agents[agent_id]
+
+    def add_entry(self, step_num, move_direction, agent_states, termination, truncation, info, moves=None):
+        '''
+        agent_states - AgentStates of the step (sim/state.py)
+        moves - {vehicle_id: direction} of all players who moved (realtime only)
+        '''
         entry = {
             "step": step_num,
             "move": move_direction,
@@ -22,23 +106,163 @@ class Logger:
             "truncation": truncation,
             "info": info
         }
-        self.logs.append(entry)
+        if moves is not None:
+            entry["moves"] = moves
+
+        ids = agent_states.ids
+        records = np.empty(len(ids), dtype=STATE_DTYPE)
+        records["entry"] = self.steps
+        records["step"] = step_num
+        records["agent"] = [self.agent_index(aid, is_human, agent_states.goals.get(aid))
+                            for aid, is_human in zip(ids, agent_states.humans.tolist())]
+        for ind, field in enumerate(("x", "y", "vx", "vy", "heading")):
+            records[field] = agent_states.array[:, ind]
+        records["flags"] = [get_flags(info.get(aid) or {}) for aid in ids] if info else 0
+        self.records.append(records)
+
+        event = {
+            "step": step_num,
+            "move": move_direction,
+            "termination": termination,
+            "truncation": truncation,
+            "info": info
+        }
+        if moves is not None:
+            event["moves"] = moves
+        self.events.append(json.dumps(event, default=to_serializable))
+
+        self.steps += 1
+        if self.steps % self.chunk_steps == 0:
+            self.flush()
+
         return entry
 
-    def to_serializable(self, obj):
-        if isinstance(obj, (np.integer, np.int_, np.intc, np.intp, np.int8, np.int16, np.int32, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float_, np.float16, np.float32, np.float64)):
-            return float(obj)
-        elif isinstance(obj, (np.ndarray,)):
-            return obj.tolist()
-        elif isinstance(obj, (np.bool_)):
-            return bool(obj)
-        return obj
+    def flush(self):
+        mode = "ab" if self.started else "wb"
+        with open(self.get_path("states.bin"), mode) as f:
+            if self.records:
+                np.concatenate(self.records).tofile(f)
+            f.flush()
+            if settings.log_fsync:
+                os.fsync(f.fileno())
+
+        with open(self.get_path("events.jsonl"), mode.replace("b", "")) as f:
+            f.writelines(line + "\n" for line in self.events)
+            f.flush()
+            if settings.log_fsync:
+                os.fsync(f.fileno())
+
+        self.records.clear()
+        self.events.clear()
+        self.started = True
+        self.write_meta(complete=False)
+
+    def write_meta(self, complete):
+        meta = {
+            "version": LOG_VERSION,
+            "scenario_id": self.scenario_id,
+            "agents": list(self.agents),
+            "humans": self.humans,
+            "goals": self.goals,
+            "steps": self.steps,
+            "complete": complete,
+        }
+        tmp = self.get_path("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, default=to_serializable)
+        os.replace(tmp, self.get_path("meta.json"))
 
     def save(self):
-        filename = f"scenario_{self.scenario_id}.json"
-        filename = self.prefix + filename if self.prefix else filename
-        log_path = self.log_dir / filename
-        with open(log_path, "w") as f:
-            json.dump(self.logs, f, indent=2, default=self.to_serializable)
\ No newline at end of file
+        self.flush()
+        self.write_meta(complete=True)
+
+        if settings.log_export_json:
+            LogReader(self.scenario_id, self.prefix).export_json()
+
+
+class LogReader:
+    '''
+    Reads logs written by Logger, converts them back to the documented JSON format on demand.
+    '''
+    def __init__(self, scenario_id, prefix=None, log_dir=None):
+        self.scenario_id = scenario_id
+        self.prefix = prefix
+        self.log_dir = Path(log_dir) if log_dir else settings.logs_dir
+
+    def get_path(self, suffix):
+        return self.log_dir / f"{get_log_name(self.scenario_id, self.prefix)}.{suffix}"
+
+    def exists(self):
+        return self.get_path("meta.json").exists()
+
+    def meta(self):
+        with open(self.get_path("meta.json"), "r") as f:
+            return json.load(f)
+
+    def states(self, meta=None):
+        '''
+        Records in the current STATE_DTYPE, older logs are converted (flags are 0 there)
+        '''
+        version = (meta or self.meta()).get("version", 1)
+        if version >= 2:
+            return np.fromfile(self.get_path("states.bin"), dtype=STATE_DTYPE)
+
+        old = np.fromfile(self.get_path("states.bin"), dtype=STATE_DTYPE_V1)
+        states = np.zeros(len(old), dtype=STATE_DTYPE)
+        for name in STATE_DTYPE_V1.names:
+            states[name] = old[name]
+        return states
+
+    def events(self):
+        with open(self.get_path("events.jsonl"), "r") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_entries(self):
+        meta = self.meta()
+        agents, humans, goals = meta["agents"], meta["humans"], meta["goals"]
+
+        states = self.states(meta)
+
+        for entry_ind, event in enumerate(self.events()):
+            start, end = np.searchsorted(states["entry"], [entry_ind, entry_ind + 1])
+            positions = {}
+            for rec in states[start:end].tolist():
+                _, _, ind, x, y, vx, vy, heading, _ = rec
+                agent_id = agents[ind]
+                positions[agent_id] = {
+                    "position": [x, y],
+                    "velocity": [vx, vy],
+                    "heading": heading,
+                }
+                if agent_id in goals:
+                    positions[agent_id]["goal"] = goals[agent_id]
+                positions[agent_id]["is_human"] = humans[agent_id]
+
+            entry = {
+                "step": event["step"],
+                "move": event["move"],
+                "positions": positions,
+                "termination": event["termination"],
+                "truncation": event["truncation"],
+                "info": event["info"],
+            }
+            if "moves" in event:
+                entry["moves"] = event["moves"]
+            yield entry
+
+    def iter_json(self):
+        '''
+        Yields the log as chunks of a JSON array, entry by entry
+        '''
+        yield "[\n"
+        for ind, entry in enumerate(self.iter_entries()):
+            prefix = ",\n" if ind else ""
+            yield prefix + json.dumps(entry, indent=2, default=to_serializable)
+        yield "\n]"
+
+    def export_json(self):
+        path = self.log_dir / f"{get_log_name(self.scenario_id, self.prefix)}.json"
+        with open(path, "w") as f:
+            f.writelines(self.iter_json())
+        return path
@@ -1,26 +1,46 @@
+import asyncio
+import logging
 from multiprocessing import Pipe, Process
+from sim.pool import worker_pool
 from sim.workers.offline_worker import OfflineWorker
 from sim.workers.worker import Worker
 from sim.workers.map_preview import MapPreviewWorker
+from sim.transport import AsyncPipe
+from sim.shm import FrameRing
 from cache.maps import map_cache
 
 class SimulationManager:
     def __init__(self, WorkerClass):
         self.processes = {}
         self.pipes = {}
+        self.rings = {}
         self.WorkerClass = WorkerClass
-
-    def register_worker(self, scenario):
-        if self.is_worker_registered(scenario.id):
-            return
-        par_conn, child_conn = Pipe()
-        worker = self.WorkerClass(scenario, pipe=child_conn)
-        self.pipes[scenario.id] = par_conn
-
-        p = Process(target=worker.run)
-        self.processes[scenario.id] = p
-        p.start()
-        return worker
+        self.leasing = asyncio.Lock()  # concurrent joins of one scenario lease one worker
+
+    async def register_worker(self, scenario):
+        async with self.leasing:
+            if self.is_worker_registered(scenario.id):
+                return
+            kwargs = {}
+            ring = None
+            if self.WorkerClass.uses_frame_ring:
+                ring = FrameRing.for_scenario(scenario)
+                kwargs['frame_ring'] = ring.spec()
+
+            try:
+                p, par_conn, ready = await worker_pool.lease(self.WorkerClass, scenario, **kwargs)
+            except BaseException:
+                if ring:
+                    ring.close()
+                raise
+            if ring:
+                self.rings[scenario.id] = ring
+            pipe = AsyncPipe(par_conn)
+            if not ready:
+                pipe.stale += 1  # skip READY of a process that is still warming up
+
+            self.pipes[scenario.id] = pipe
+            self.processes[scenario.id] = p
 
     def is_worker_registered(self, scenario_id):
         return scenario_id in self.processes
@@ -31,15 +51,51 @@ class SimulationManager:
         
         return None
     
-    def unregister_worker(self, scenario_id):
+    async def unregister_worker(self, scenario_id):
         if not self.is_worker_registered(scenario_id):
             return
         
-        self.processes[scenario_id].join()
-        del self.processes[scenario_id]
-        del self.pipes[scenario_id]
+        process = self.processes.pop(scenario_id)
+        pipe = self.pipes.pop(scenario_id)
+        ring = self.rings.pop(scenario_id, None)
+        try:
+            await asyncio.to_thread(process.join)
+        finally:
+            pipe.close()
+            if ring:
+                ring.close()
+
+    async def stop_worker(self, scenario_id):
+        '''
+        Kill the worker of an abandoned scenario, it only exits by itself once the scenario finishes
+        '''
+        if process := self.processes.get(scenario_id):
+            process.terminate()
+        await self.unregister_worker(scenario_id)
+
+    async def close(self):
+        '''
+        Stop all workers of this process and unlink their rings (node shutdown)
+        '''
+        for scenario_id in list(self.processes):
+            await self.stop_worker(scenario_id)
+
+    def attach_frames(self, scenario_id, response, copy=False):
+        '''
+        Replace the ring location of turn frames with a view of the ring
+        (a copy if the ring is about to be released)
+        '''
+        frames = response.get('frames')
+        ring = self.rings.get(scenario_id)
+        if not ring or not isinstance(frames, dict) or 'shm' not in frames:
+            return response
+
+        location = frames.pop('shm')
+        data = ring.read(location['offset'], location['count'], len(frames['agents']))
+        frames['data'] = data.copy() if copy else data
+        return response
     
-    def process_move(self, move, scenario_id=None):
+    async def process_move(self, move, scenario_id=None):
 
         if not scenario_id:
             scenario_id = getattr(move, 'scenario_id')
@@ -49,12 +105,16 @@ class SimulationManager:
         if not pipe:
             raise Exception("Scenario not registered")
         
-        pipe.send(move)
-
-        response = pipe.recv()
+        try:
+            response = await pipe.request(move)
+        except EOFError:  # worker died
+            await self.stop_worker(scenario_id)
+            raise
+        finished = response.get('status') == "FINISHED"
+        self.attach_frames(scenario_id, response, copy=finished)
 
-        if response['status'] == "FINISHED":
-            self.unregister_worker(scenario_id)
+        if finished:
+            await self.unregister_worker(scenario_id)
 
         return response
     
@@ -69,20 +129,30 @@ def build_map(scenario):
     return map_resp
 
 def map_preview(scenario):
-    map_id = scenario.map.id
+    layout = scenario.map.layout
 
-    if map_cache.exists(map_id):
-        return map_cache.get(map_id)
-    
-    blob = build_map(scenario)
-    map_cache.add_map(map_id, blob)
+    if blob := map_cache.get(layout):
+        return blob
 
-    return blob
-    
+    return build_map(scenario)  # the worker stores the render in map_cache
 
 
+def warm_map_renders(layouts):
+    '''
+    Render every layout missing in map_cache (blocking, one MetaDrive process per layout)
+    '''
+    from schemas.results import Scenario as SScenario
+
+    for layout in set(layouts):
+        if map_cache.exists(layout):
+            continue
+        try:
+            build_map(SScenario(id=0, vehicles=[], steps=1, status=None,
+                                map={"id": 0, "layout": layout}))
+        except Exception:
+            logging.exception(f"Failed to render layout {layout}")
+
 
-    
 manager = SimulationManager(Worker)
 
 offline_manager = SimulationManager(OfflineWorker)
@@ -8,6 +8,7 @@ class MovingExampleManager(BaseManager):
 
     def __init__(self, avs):
         self.avs = avs
+        self.av_keys = {}  # object id -> scenario vehicle id, object ids change on every reset
         super().__init__()
 
     def before_step(self):
@@ -19,6 +20,7 @@ class MovingExampleManager(BaseManager):
                 pass
 
     def reset(self):
+        self.av_keys = {}
         for av in self.avs:
             obj = self.spawn_object(DefaultVehicle,
                                     vehicle_config=dict(),
@@ -26,6 +28,7 @@ class MovingExampleManager(BaseManager):
                                     heading=0)
             obj.set_velocity([av.init_speed, 0])
             self.add_policy(obj.id, IDMPolicy, obj, self.generate_seed())
+            self.av_keys[obj.id] = av.id
 
     def after_step(self):
         for obj in self.spawned_objects.values():
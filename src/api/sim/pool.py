@@ -0,0 +1,139 @@
+import asyncio
+import time
+from multiprocessing import get_context
+
+from settings import settings
+from metrics import LatencyStats
+
+ctx = get_context("spawn")
+
+
+def warm_entry(conn):
+    '''
+    Entry point of a pooled process.
+    Pays the metadrive import before any scenario is assigned, reports READY and
+    then turns into a regular worker (the env depends on the scenario, so it is built on lease).
+    '''
+    from sim.multi_mixed_env import MultiPlayerEnv  # noqa: F401 - imports metadrive
+
+    conn.send({"status": "READY", "time": time.time()})
+
+    lease = conn.recv()
+    if lease is None:  # pool is shutting down
+        return
+
+    WorkerClass, scenario, kwargs = lease
+    worker = WorkerClass(scenario, pipe=conn, **kwargs)
+    worker.run()
+
+
+class PooledProcess:
+    def __init__(self):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=warm_entry, args=(child_conn,))
+        self.spawned_at = time.time()
+        self.ready_at = None
+        self.process.start()
+        child_conn.close()
+
+    def is_ready(self):
+        if self.ready_at is None and self.conn.poll():
+            self.ready_at = self.conn.recv()["time"]
+        return self.ready_at is not None
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+
+class WorkerPool:
+    '''
+    Pool of pre-spawned processes that already imported metadrive.
+    Scenarios lease a process (preferring a ready one), the pool is topped up in
+    the background right after every lease, so the spawn cost is not paid by the request.
+    Processes are spawned in a thread, starting them blocks.
+    '''
+
+    def __init__(self, size: int):
+        self.size = size
+        self.idle = []
+        self.refilling = None
+        self.hits = 0
+        self.misses = 0
+        self.spawn_time = LatencyStats()
+
+    def _refresh(self):
+        alive = []
+        for pooled in self.idle:
+            if not pooled.is_alive():
+                continue
+            was_ready = pooled.ready_at is not None
+            if pooled.is_ready() and not was_ready:
+                self.spawn_time.add(pooled.ready_at - pooled.spawned_at)
+            alive.append(pooled)
+        self.idle = alive
+
+    async def fill(self):
+        self._refresh()
+        while len(self.idle) < self.size:
+            self.idle.append(await asyncio.to_thread(PooledProcess))
+
+    def fill_later(self):
+        if self.refilling is None or self.refilling.done():
+            self.refilling = asyncio.create_task(self.fill())
+
+    def _take(self):
+        for ready_only in (True, False):
+            for pooled in self.idle:
+                if ready_only and not pooled.is_ready():
+                    continue
+                self.idle.remove(pooled)
+                return pooled
+        return None
+
+    async def lease(self, WorkerClass, scenario, **kwargs):
+        '''
+        Returns (process, connection, ready) of a worker running the scenario.
+        If ready is False the READY message of the process is still in flight
+        and the caller has to skip it before the first response.
+        '''
+        self._refresh()
+        pooled = self._take()
+
+        if pooled and pooled.is_ready():
+            self.hits += 1
+        else:
+            self.misses += 1
+            if pooled is None:
+                pooled = await asyncio.to_thread(PooledProcess)
+
+        pooled.conn.send((WorkerClass, scenario, kwargs))
+        self.fill_later()
+
+        return pooled.process, pooled.conn, pooled.is_ready()
+
+    def close(self):
+        if self.refilling:
+            self.refilling.cancel()
+        for pooled in self.idle:
+            try:
+                pooled.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for pooled in self.idle:
+            pooled.process.join(timeout=5)
+        self.idle.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": self.size,
+            "idle": len(self.idle),
+            "ready": len([p for p in self.idle if p.ready_at is not None]),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "spawn_time": self.spawn_time.to_dict(),
+        }
+
+
+worker_pool = WorkerPool(settings.worker_pool_size)
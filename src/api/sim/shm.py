@@ -0,0 +1,73 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from settings import settings
+from sim.frames import FIELDS
+
+
+class FrameRing:
+    '''
+    Shared-memory ring of agent states: float32[slots, agents, FIELDS].
+
+    Created by the API process for every offline worker (sized for its scenario, see for_scenario)
+    and attached by the worker with the same spec.
+    The worker writes the frames of a turn into consecutive slots and sends only
+    {"offset", "count"} through the pipe; the API process reads them as a view of the ring.
+    Turns of one worker are strictly sequential, so a turn is only overwritten by the next one.
+    '''
+
+    def __init__(self, name=None, slots=None, agents=None):
+        self.slots = slots or settings.frame_ring_slots
+        self.agents = agents or settings.frame_ring_agents
+        shape = (self.slots, self.agents, len(FIELDS))
+        size = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.array = np.ndarray(shape, dtype=np.float32, buffer=self.shm.buf)
+        self.head = 0
+
+    @classmethod
+    def for_scenario(cls, scenario):
+        '''
+        Ring holding one turn of the scenario: a turn never has more frames than the horizon
+        nor more agents than the scenario vehicles
+        '''
+        return cls(slots=min(scenario.steps + 1, settings.frame_ring_slots),
+                   agents=max(min(len(scenario.vehicles), settings.frame_ring_agents), 1))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        return {"name": self.name, "slots": self.slots, "agents": self.agents}
+
+    def fits(self, rows: np.ndarray):
+        return len(rows) <= self.slots and rows.shape[1] <= self.agents
+
+    def write(self, rows: np.ndarray):
+        '''
+        rows - float32[frames, agents, FIELDS]. Returns offset of the first frame,
+        frames are always stored contiguously (wraps to 0 instead of splitting).
+        '''
+        count, agents = rows.shape[:2]
+        if self.head + count > self.slots:
+            self.head = 0
+        offset = self.head
+        self.array[offset:offset + count, :agents] = rows
+        self.head += count
+        return offset
+
+    def read(self, offset: int, count: int, agents: int):
+        return self.array[offset:offset + count, :agents]  # view, no copy
+
+    def close(self):
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:  # a frame view is still referenced, mapping is released with it
+            pass
+        if self.owner:
+            self.shm.unlink()
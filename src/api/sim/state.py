@@ -0,0 +1,102 @@
+import numpy as np
+
+STATE_FIELDS = ["x", "y", "vx", "vy", "heading"]
+
+
+class AgentStates:
+    '''
+    States of all agents at one step: ids[i] -> array[i] = [x, y, vx, vy, heading].
+    `array` is a view into the extractor buffer, valid until the next extract (copy to keep it).
+    '''
+
+    def __init__(self, ids, array, humans, goals):
+        self.ids = ids
+        self.array = array
+        self.humans = humans  # bool per row
+        self.goals = goals  # agent_id -> goal, humans only
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_dict(self):
+        '''
+        Dict view in the documented format, built only when states leave the worker
+        '''
+        states = {}
+        for agent_id, (x, y, vx, vy, heading), is_human in zip(self.ids, self.array.tolist(), self.humans.tolist()):
+            state = {"position": [x, y], "velocity": [vx, vy], "heading": heading}
+            if is_human:
+                state["goal"] = self.goals.get(agent_id)
+            state["is_human"] = is_human
+            states[agent_id] = state
+        return states
+
+
+class StateExtractor:
+    '''
+    Batched agent state extraction.
+    Object handles and human flags are collected once and only rebuilt when the set of
+    agents or spawned traffic changes; every step only reads position, velocity and heading
+    of the cached handles into a preallocated array.
+    Goals are cached per episode once navigation provides them (call reset() after env.reset()).
+    '''
+
+    def __init__(self, worker, capacity=32):
+        self.worker = worker
+        self.buffer = np.zeros((capacity, len(STATE_FIELDS)), dtype=np.float64)
+        self.signature = None
+        self.ids = []
+        self.handles = []
+        self.humans = np.zeros(0, dtype=bool)
+        self.goals = {}
+        self.missing_goals = set()  # humans without navigation yet, looked up again every step
+
+    def reset(self):
+        self.signature = None
+        self.goals = {}
+        self.missing_goals = set()
+
+    def find_goals(self):
+        for agent_id in list(self.missing_goals):
+            goal = self.worker.get_agent_destination(agent_id)
+            if goal is not None:  # goal region does not change during the episode
+                self.goals[agent_id] = goal
+                self.missing_goals.discard(agent_id)
+
+    def refresh(self, agents, traffic):
+        self.ids, self.handles, humans = [], [], []
+        for agent_id, agent in agents.items():
+            self.ids.append(agent_id)
+            self.handles.append(agent)
+            humans.append(True)
+
+        for av_id, av_obj in traffic.items():
+            if av_id not in agents:
+                self.ids.append(av_id)
+                self.handles.append(av_obj)
+                humans.append(False)
+
+        self.humans = np.array(humans, dtype=bool)
+        self.missing_goals = {agent_id for agent_id in agents if agent_id not in self.goals}
+        if len(self.ids) > len(self.buffer):
+            self.buffer = np.zeros((2 * len(self.ids), len(STATE_FIELDS)), dtype=np.float64)
+
+    def extract(self) -> AgentStates:
+        engine = self.worker.env.engine
+        agents, traffic = engine.agents, engine.traffic_manager.spawned_objects
+
+        # objects are compared by identity: an env reset creates new ones under the same ids
+        signature = (tuple(agents), tuple(traffic), tuple(map(id, agents.values())), tuple(map(id, traffic.values())))
+        if signature != self.signature:
+            self.refresh(agents, traffic)
+            self.signature = signature
+        if self.missing_goals:
+            self.find_goals()
+
+        array = self.buffer[:len(self.handles)]
+        for row, obj in zip(array, self.handles):
+            row[0:2] = obj.position
+            row[2:4] = obj.velocity
+            row[4] = obj.heading_theta
+
+        return AgentStates(self.ids, array, self.humans, self.goals)
@@ -0,0 +1,59 @@
+import asyncio
+
+
+class AsyncPipe:
+    '''
+    Asyncio wrapper around the parent end of a worker Pipe.
+
+    Requests on the same pipe are serialized with a lock; the response is awaited
+    through a reader callback on the pipe fd, so the event loop keeps serving other
+    scenarios while the worker is stepping MetaDrive.
+    '''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = asyncio.Lock()
+        self.stale = 0  # responses of cancelled requests still sitting in the pipe
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    async def recv(self, track_stale=True):
+        if self.conn.poll():
+            return self.conn.recv()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_readable():
+            loop.remove_reader(fd)
+            if future.done():
+                return
+            try:
+                future.set_result(self.conn.recv())
+            except Exception as e:  # EOFError if worker died
+                future.set_exception(e)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Response was not read => it will arrive later and must be skipped
+            if track_stale and not (future.done() and not future.cancelled()):
+                self.stale += 1
+            raise
+        finally:
+            loop.remove_reader(fd)
+
+    async def request(self, message):
+        async with self.lock:
+            while self.stale:
+                await self.recv(track_stale=False)
+                self.stale -= 1
+
+            self.conn.send(message)
+            return await self.recv()
+
+    def close(self):
+        self.conn.close()
@@ -1,4 +1,6 @@
 from sim.logger import Logger
+from sim.state import StateExtractor, AgentStates
+from cache.maps import map_cache, MAP_SAMPLE_INTERVAL
 from abc import ABC, abstractmethod
 from sim.utils import get_termination_reason
 import numpy as np
@@ -7,9 +9,12 @@ import logging
 from metadrive.envs import MetaDriveEnv
 from metadrive.type import MetaDriveType
 
+PARK_POSITION = (-10000.0, -10000.0)  # agents taken out of a restored env (see restore)
 
 
 class BaseWorker(ABC):
+    uses_frame_ring = False  # turn frames are passed through a shared memory FrameRing
+
     def __init__(self, scenario, pipe=None):
         self.scenario = scenario
         self.avs, self.humans = self.split_vehicles()
@@ -20,30 +25,11 @@ class BaseWorker(ABC):
         self.logger = Logger(self.scenario.id)
         self.rendered_map = None
         self.pipe = pipe
+        self.extractor = StateExtractor(self)
 
 
     def get_agent_states(self):
-        agent_states = {
-            agent_id: {
-                "position": self.env.engine.agents[agent_id].position.tolist(),
-                "velocity": self.env.engine.agents[agent_id].velocity.tolist(),
-                "heading": self.env.engine.agents[agent_id].heading_theta,
-                'goal': self.get_agent_destination(agent_id),
-                "is_human": True,
-            }
-            for agent_id in self.env.engine.agents
-        }
-
-        for av_id, av_obj in self.env.engine.traffic_manager.spawned_objects.items():
-            if av_id not in agent_states:
-                agent_states[av_id] = {
-                    "position": av_obj.position.tolist(),
-                    "velocity": av_obj.velocity.tolist(),
-                    "heading": av_obj.heading_theta,
-                    "is_human": False
-                }
-
-        return agent_states
+        return self.extractor.extract().to_dict()
     
 
     def get_agent_destination(self, agent_id):
@@ -97,12 +83,13 @@ class BaseWorker(ABC):
 
     
 
-    def generate_log_entry(self, info, tm, tr, to_transmit=False, move=None):
+    def generate_log_entry(self, info, tm, tr, to_transmit=False, move=None, direction=None, moves=None):
 
         entry = self.logger.add_entry(
             step_num=self.current_step,
-            move_direction=move.direction if move else 'N/A',
-            agent_states=self.get_agent_states(),
+            move_direction=direction or (move.direction if move else 'N/A'),
+            moves=moves,
+            agent_states=self.extractor.extract(),  # converted to dicts in get_json
             termination=tm,
             truncation=tr,
             info=info
@@ -149,7 +136,7 @@ class BaseWorker(ABC):
         "lane_width": <float>,
         "features": [
             { "kind": "lane" | "road_line" | "boundary_line",
-            "polyline": [[x,y], ...],
+            "polyline": [x0, y0, x1, y1, ...],
             "style": { "width": <m> }                # for lanes
             # or
             "style": { "color": "#FFFFFF|#FFD400",
@@ -160,8 +147,7 @@ class BaseWorker(ABC):
         ]
         }
     """
-        line_sample_interval = 2
-        all_feats = md_map.get_map_features(line_sample_interval)
+        all_feats = md_map.get_map_features(MAP_SAMPLE_INTERVAL)
 
         # lane width & stripe width
         lane_width = float(md_map.config.get("lane_width", 3.5))
@@ -185,8 +171,8 @@ class BaseWorker(ABC):
             if poly is None or len(poly) < 2:
                 continue
 
-            # keep MetaDrive (x,y) order; cast to float
-            poly_xy = [[float(x), float(y)] for (x, y) in poly]
+            # keep MetaDrive (x,y) order; flat, rounded to mm
+            poly_xy = np.round(np.asarray(poly, dtype=np.float64)[:, :2], 3).ravel().tolist()
 
             if MetaDriveType.is_lane(md_type):
                 out_map["features"].append({
@@ -236,11 +222,21 @@ class BaseWorker(ABC):
             config.pop('num_agents')
             self.env = MetaDriveEnv(config=config)
         self.env.reset()
+        self.extractor.reset()  # goals belong to the previous episode
 
         for human, agent_id in zip(self.humans, self.env.agents.keys()):
             self.agent_ids[human.id] = agent_id
 
-        self.rendered_map = self.render_map(self.env.current_map)
+        self.rendered_map = self.get_rendered_map()
+
+    def get_rendered_map(self):
+        layout = self.scenario.map.layout
+        if cached := map_cache.get(layout):
+            return cached['map']
+
+        rendered = self.render_map(self.env.current_map)
+        map_cache.add_map(layout, {'map': rendered})
+        return rendered
 
 
 
@@ -253,10 +249,82 @@ class BaseWorker(ABC):
             agent.set_velocity([vehicle.init_speed, 0])
 
 
+    def get_object_state(self, obj):
+        return {
+            "position": obj.position.tolist(),
+            "velocity": obj.velocity.tolist(),
+            "heading": float(obj.heading_theta),
+        }
+
+    def set_object_state(self, obj, state):
+        obj.set_position(state["position"])
+        obj.set_heading_theta(state["heading"])
+        obj.set_velocity(state["velocity"])
+
+    def snapshot(self):
+        """
+        Capture state of all agents and IDM traffic of the live env.
+        Snapshot is a plain dict, so it can be sent to any process running the same
+        scenario (e.g. preview engine) and restored there with restore().
+        Returns:
+        {
+            "step": <int>,
+            "agents": {agent_id: {"position", "velocity", "heading"}},
+            "traffic": {av_vehicle_id: {"position", "velocity", "heading"}}
+        }
+        """
+        engine = self.env.engine
+        traffic = engine.traffic_manager
+        return {
+            "step": self.current_step,
+            "agents": {aid: self.get_object_state(agent) for aid, agent in engine.agents.items()},
+            "traffic": {traffic.av_keys[oid]: self.get_object_state(obj)
+                        for oid, obj in traffic.spawned_objects.items() if oid in traffic.av_keys},
+        }
+
+    def park(self, obj, ind):
+        '''
+        Move an agent far away from the map, so nothing in the env can collide with it
+        '''
+        obj.set_position([PARK_POSITION[0] - 50 * ind, PARK_POSITION[1]])
+        obj.set_velocity([0, 0])
+
+    def restore(self, snapshot):
+        """
+        Put env of the same scenario into the snapshot state (right after a reset).
+        Traffic is matched by the id of its scenario vehicle. Agents missing in the snapshot
+        (terminated in the live env) are parked away from the map, missing traffic is removed.
+        The env episode step is not restored (it restarts at 0), callers stepping the restored
+        env must stop at the remaining horizon themselves (see Subworker.rollout).
+        """
+        engine = self.env.engine
+        for ind, (aid, agent) in enumerate(list(engine.agents.items())):
+            if aid in snapshot["agents"]:
+                self.set_object_state(agent, snapshot["agents"][aid])
+            else:
+                self.park(agent, ind)
+
+        traffic = engine.traffic_manager
+        removed = []
+        for oid, obj in traffic.spawned_objects.items():
+            key = traffic.av_keys.get(oid)
+            if key in snapshot["traffic"]:
+                self.set_object_state(obj, snapshot["traffic"][key])
+            else:
+                removed.append(oid)
+        if removed:
+            traffic.clear_objects(removed)
+
+        self.current_step = snapshot["step"]
+
+
 
 
 
     def get_json(self, state, status="ACTIVE", get_map=True):
+        if isinstance(state.get('positions'), AgentStates):
+            state = {**state, 'positions': state['positions'].to_dict()}
+
         message_body = {
             "scenario_id": self.scenario.id,
             "status": status,
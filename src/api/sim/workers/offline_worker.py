@@ -2,32 +2,51 @@ from sim.workers.base_worker import BaseWorker
 from schemas.offline import OfflineScenarioPreview
 from typing import List
 from sim.workers.subworker import Subworker
-from multiprocessing import Process, Queue, set_start_method
+from sim.frames import FrameSampler, FramePacker
+from sim.shm import FrameRing
+from multiprocessing import Process, Pipe, set_start_method
 from sim.utils import get_termination_reason
 
+import numpy as np
 import logging
 
 set_start_method("spawn", force=True)
 
 
 class OfflineWorker(BaseWorker):
-
-    def to_flat_view(self, moves: List[OfflineScenarioPreview]):
-        flat = {}
+    uses_frame_ring = True
+
+    def __init__(self, scenario, pipe=None, frame_ring=None):
+        super().__init__(scenario, pipe)
+        self.frame_ring = FrameRing(**frame_ring) if frame_ring else None  # attached by spec
+        self.preview_pipe = None
+        self.preview_process = None
+        self.frame_sampler = FrameSampler(scenario.frame_policy, scenario.frame_stride)
+
+    def to_action_tensor(self, moves: List[OfflineScenarioPreview], steps: int):
+        """
+        Expand run-length moves of the turn into a dense action array.
+        Returns (agent_order, actions) where actions[step, agent] = [steering, acceleration];
+        agents without a move (or with a shorter one) stand still.
+        """
+        agent_order = list(self.env.engine.agents.keys())
+        index = {aid: ind for ind, aid in enumerate(agent_order)}
+        actions = np.zeros((steps, len(agent_order), 2), dtype=np.float32)
 
         for move in moves:
-            agent_id = self.agent_ids[move.vehicle_id]
-            flat[agent_id] = {}
+            col = index.get(self.agent_ids.get(move.vehicle_id))
+            if col is None:
+                continue
             curr = 0
 
             for dsm in move.moves:
-                for step in range(dsm.steps):
-                    flat[agent_id][curr + step] = [dsm.steering, dsm.acceleration]
-
-                curr += dsm.steps
-
+                end = min(curr + dsm.steps, steps)
+                actions[curr:end, col] = (dsm.steering, dsm.acceleration)
+                curr = end
+                if curr >= steps:
+                    break
 
-        return flat
+        return agent_order, actions
 
     
     def preprocessor(self, data: dict) -> List[OfflineScenarioPreview]:
@@ -53,21 +72,13 @@ class OfflineWorker(BaseWorker):
 
     def process_move(self, data: dict):
         moves, steps = self.preprocessor(data)
-        frames = []
+        frames = FramePacker(self.frame_sampler)
 
-        flat = self.to_flat_view(moves)
+        agent_order, actions = self.to_action_tensor(moves, steps)
 
         state = None
         for step in range(steps):
-            move = {}
-            for agent_id in self.agent_ids.values():
-                move[agent_id] = flat[agent_id][step]
-
-            for aid in self.env.engine.agents.keys():
-                if aid not in move:
-                    move[aid] = [0.0, 0.0]
-
-            obj, reward, tm, tr, info = self.env.step(move)
+            obj, reward, tm, tr, info = self.env.step(dict(zip(agent_order, actions[step])))
 
             state = self.generate_log_entry(info, tm, tr, True)
             
@@ -75,17 +86,18 @@ class OfflineWorker(BaseWorker):
 
             if self.all_done(tm, tr):
                 finish_state = self.process_finish(state, None) # Replace None later
-                finish_state['frames'] = frames
+                finish_state['frames'] = frames.pack(self.frame_ring)
                 finish_state['tm_info'] = self.form_tm_info(self.get_dones(tm, tr), info)
                 logging.warning(f"Finish tm info: {finish_state['tm_info']}")
                 return finish_state, False
             elif dones := self.get_dones(tm, tr):
                 state = self.get_json(state)
-                state['frames'] = frames
+                state['frames'] = frames.pack(self.frame_ring)
                 state['tm_info'] = self.form_tm_info(dones, info)
                 return state, True
 
-            frames.append(self.get_agent_states())
+            # states are already extracted for the log entry; a changed action is an event
+            frames.add(step, state['positions'], event=step == 0 or bool(np.any(actions[step] != actions[step - 1])))
 
 
             self.current_step += 1
@@ -94,30 +106,38 @@ class OfflineWorker(BaseWorker):
             response = self.get_json(state)
         else:
             response = {}
-        response['frames'] = frames
+        response['frames'] = frames.pack(self.frame_ring)
         return response, True
     
 
-    def get_preview(self, move):
-        agent_id = self.agent_ids[move.vehicle_id]
-        agent = self.env.engine.agents[agent_id]
-        x, y = agent.position
-        speed = agent.speed
-        heading = agent.heading_theta
-        sub_worker = Subworker(self.scenario, x,y, speed, heading)
-
-        queue = Queue()
-
-        p = Process(target=sub_worker.run, args=(move, queue))
+    def start_preview_engine(self):
+        par_conn, child_conn = Pipe()
+        sub_worker = Subworker(self.scenario)
+        self.preview_process = Process(target=sub_worker.run, args=(child_conn,))
+        self.preview_process.start()
+        self.preview_pipe = par_conn
+
+    def stop_preview_engine(self):
+        if not self.preview_process:
+            return
+        self.preview_pipe.send(None)
+        self.preview_process.join()
+        self.preview_pipe.close()
+        self.preview_process, self.preview_pipe = None, None
 
-        p.start()
-        p.join()
+    def get_preview(self, move):
+        if not self.preview_process:
+            self.start_preview_engine()
 
-        state = queue.get()
+        self.preview_pipe.send((move, self.snapshot()))
 
-        return state
+        return self.preview_pipe.recv()
     
 
+    def process_finish(self, state, agent_info):
+        self.stop_preview_engine()
+        return super().process_finish(state, agent_info)
+
     def process_preview(self, data: dict):
         move = self.preview_preprocessor(data)
         return self.get_preview(move)
@@ -126,6 +146,7 @@ class OfflineWorker(BaseWorker):
     def consume_moves(self): #Overidden to handle preview
 
         self.logger.prefix = 'offline'
+        self.start_preview_engine()  # warms up in background while the first turn is collected
         
         active = True
         
@@ -141,4 +162,6 @@ class OfflineWorker(BaseWorker):
 
             self.pipe.send(response)
 
+        if self.frame_ring:
+            self.frame_ring.close()
         
\ No newline at end of file
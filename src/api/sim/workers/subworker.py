@@ -1,115 +1,77 @@
-
-
+from sim.workers.base_worker import BaseWorker
 from schemas.offline import OfflineScenarioPreview
-from metadrive.envs.metadrive_env import MetaDriveEnv
 import logging
 
 
+class Subworker(BaseWorker):
+    '''
+    Long-lived preview engine of an offline scenario.
+    Runs its own copy of the scenario env, built once. Every preview resets the episode,
+    restores the snapshot of the live env (all agents + IDM traffic) and rolls the
+    ego move forward while other humans stand still.
+    '''
 
-
-
-
-class Subworker:
-    def __init__(self, scenario, curr_x, curr_y, curr_v, curr_h):
-        self.scenario = scenario
-        self.env = None
-        self.connection = None
-        self.curr_x = curr_x
-        self.curr_y = curr_y
-        self.curr_v = curr_v
-        self.curr_h = curr_h
-        self.state = {  # To not change frontend
-            'positions':{
-                'agent0': {
-                    'position':[curr_x, curr_y],
-                    'heading': curr_h
-                }
-            }
-        }
-
-        
-
-
-
-
-    def get_vehicle_config(self):
-        return dict(
-            show_dest_mark = True,
-
-        )
-
-
-    def setup_env(self):
-        config = {
-            "use_render": False,
-            "traffic_density": 0.,
-            "map": self.scenario.map.layout,
-            "vehicle_config": self.get_vehicle_config(),
-            "out_of_road_done": False,
-            "horizon": self.scenario.steps,
-            "truncate_as_terminate": True,
-        }
-        self.env = MetaDriveEnv(config=config)
-        self.env.reset()
-
-    
-
-    def setup_vehicle(self, x, y, v, h):
-        ego_vehicle = self.env.agent
-        ego_vehicle.set_position([x, y])
-        ego_vehicle.set_velocity([v, 0])
-        ego_vehicle.set_heading_theta(h)
-
-
-    
-    def get_json(self, frames):
+    def get_json(self, state, frames):
         message_body = {
             "scenario_id": self.scenario.id,
             "status": "PREVIEW",
             "map": {},
-            "state": self.state,
+            "state": state,
             "frames": frames
         }
 
         return message_body
-    
-    def get_agent_state(self, x, y, h):
-        return {
-            'agent0':{
-                "position": [x, y],
-                "heading": [h],
-                "is_human": True
-            }
-        }
-    
-
 
+    def get_visible_states(self, snapshot):
+        # Agents already terminated in the live env are parked by restore() and not shown
+        return {aid: state for aid, state in self.get_agent_states().items()
+                if aid in snapshot["agents"] or not state["is_human"]}
 
-    def process_move(self, move: OfflineScenarioPreview):
+    def rollout(self, move: OfflineScenarioPreview, snapshot):
+        ego_agent_id = self.agent_ids[move.vehicle_id]
+        # the env episode restarted at 0 on reset, the live one ends at the scenario horizon
+        remaining = self.scenario.steps - snapshot["step"]
         frames = []
         for mv in move.moves:
             move_arr = [mv.steering, mv.acceleration]
             for s in range(mv.steps):
-                obj, reward, tm, tr, info = self.env.step(move_arr)
+                if ego_agent_id not in self.env.engine.agents:
+                    return frames  # ego terminated during preview
+                if len(frames) >= remaining:
+                    return frames  # live run is truncated here
 
-                x, y = self.env.agent.position
-                h = self.env.agent.heading_theta
-                frames.append(self.get_agent_state(x, y, h))
+                step = {aid: [0.0, 0.0] for aid in self.env.engine.agents.keys()}
+                step[ego_agent_id] = move_arr
+                obj, reward, tm, tr, info = self.env.step(step)
 
-        
-        return self.get_json(frames)
+                frames.append(self.get_visible_states(snapshot))
 
+        return frames
 
-    def run(self, move, queue=None):
-        self.setup_env()
-        self.setup_vehicle(self.curr_x, self.curr_y, self.curr_v, self.curr_h)
-        state = self.process_move(move)
-
-        if queue:
-            queue.put(state)
+    def preview(self, move, snapshot):
+        self.env.reset()  # map is kept between resets, only the episode is restarted
+        self.extractor.reset()  # goals belong to the previous episode
+        self.restore(snapshot)
+        state = {'positions': self.get_visible_states(snapshot)}
+        return self.get_json(state, self.rollout(move, snapshot))
 
-        return state
+    def process_move(self, request):
+        move, snapshot = request
+        return self.preview(move, snapshot), True
 
+    def run(self, pipe):
+        self.setup_env()
 
+        while True:
+            request = pipe.recv()
+            if request is None:
+                break
 
+            try:
+                response, _ = self.process_move(request)
+                pipe.send(response)
+            except Exception as e:
+                logging.exception(f"Preview failed for scenario {self.scenario.id}")
+                pipe.send({**self.get_json({}, []), "error": str(e)})
 
+        self.env.close()
@@ -1,6 +1,7 @@
 from sim.workers.base_worker import BaseWorker
-from schemas.results import Move
+from schemas.results import Tick
 from sim.move_converter import MoveConverter
+from sim.utils import get_termination_reason
 
 import numpy as np
 import logging
@@ -9,56 +10,42 @@ import logging
 class Worker(BaseWorker):
      def __init__(self, scenario, pipe=None):
         super().__init__(scenario, pipe)
-        self.map_sent = {}
+        self.terminated = set()
 
 
-     def process_move(self, move: Move):
-        move_arr = MoveConverter.convert(move)
-        if move.direction == "KEEP_ALIVE":
-            ego_agent_id = None
-        
-        else:
-            ego_agent_id = self.agent_ids[move.vehicle_id]
+     def get_new_terminations(self, tm, tr, info):
+        '''
+        Returns {vehicle_id: reason} for humans terminated at this step
+        '''
+        terminated = {}
+        for vid, aid in self.get_dones(tm, tr):
+            if vid not in self.terminated:
+                self.terminated.add(vid)
+                terminated[vid] = get_termination_reason(info.get(aid, {}))
+                logging.info(f"Scenario {self.scenario.id}: agent {aid} terminated at step {self.current_step} due to {terminated[vid]}")
+        return terminated
 
-        step = {}
-        for agent_id in self.agent_ids.values():
-            if ego_agent_id and agent_id == ego_agent_id:
-                step[agent_id] = move_arr
 
-            else:
-                step[agent_id] = np.array([0,0])
+     def process_move(self, tick: Tick):
+        step = {agent_id: np.array([0, 0]) for agent_id in self.env.agents.keys()}
+        for move in tick.moves:
+            agent_id = self.agent_ids.get(move.vehicle_id)
+            if agent_id in step:
+                step[agent_id] = MoveConverter.convert(move)
 
+        obs, reward, tm, tr, info = self.env.step(step)
 
-        
-        try:
-            obs, reward, tm, tr, info = self.env.step(step)
-        except KeyError:
-            logging.warning(f"Catched KeyError - step: {step}, active agents: {self.env.agents.keys()}")
-            for agent_id in self.env.agents.keys():
-                if agent_id not in step:            # Weird Bug
-                    step[agent_id] = np.array([0,0])
-
-            obs, reward, tm, tr, info = self.env.step(step)
-        
-
-        state = self.generate_log_entry(info, tm, tr, True, move=move)
-        state['time'] = move.timestamp
-
+        state = self.generate_log_entry(info, tm, tr, True, direction=tick.direction(), moves=tick.directions())
+        state['time'] = tick.timestamp
+        terminated = self.get_new_terminations(tm, tr, info)
 
         if self.all_done(tm, tr):  # Strange Bug with MetaDrive
             logging.warning("All agents done")
-            agent_info = info.get(ego_agent_id, None)
+            agent_info = info.get(self.agent_ids[next(iter(terminated))], None) if terminated else None
             return self.process_finish(state, agent_info), False
-        elif self.ego_done(tm, tr, ego_agent_id):
-            logging.warning(f"Agent {ego_agent_id} done")
-            # if ego_agent_id in self.agent_ids.values():
-            #     del self.agent_ids[ego_agent_id]
-            return self.process_termination(state, ego_agent_id, info), True
 
         self.current_step += 1
 
-        send_map = self.map_sent.get(ego_agent_id, True)
-        if send_map:
-            self.map_sent[ego_agent_id] = False
-
-        return self.get_json(state, get_map=send_map), True
\ No newline at end of file
+        response = self.get_json(state, get_map=tick.send_map)
+        response['terminated'] = terminated
+        return response, True
@@ -1,5 +1,6 @@
 import React, { useEffect, useRef } from "react";
 import * as THREE from "three";
+import { polylinePoints } from "../utils/map";
 
 /**
  * StaticMapPlot — draws only the map and fits/centers it in view.
@@ -8,7 +9,7 @@ import * as THREE from "three";
  *  - map: {
  *      features?: Array<{
  *        kind: "lane" | "road_line" | "boundary_line",
- *        polyline: [number, number][],
+ *        polyline: number[],          // flat [x0, y0, x1, y1, ...]
  *        style?: { color?: string, pattern?: "solid" | "dashed" }
  *      }>
  *    } | null
@@ -146,7 +147,7 @@ export default function StaticMapPlot({
     const bbox = new THREE.Box2();
     let hasPoint = false;
     for (const f of mapObj.features) {
-      const poly = f.polyline || [];
+      const poly = polylinePoints(f.polyline);
       for (const [x, y] of poly) {
         const vx = x * mtu;
         const vy = y * mtu;
@@ -218,7 +219,7 @@ function drawRichMap(mapObj, group, metersToUnits) {
   const defaultLaneColor = 0x9aa0a6; // neutral lane hint
 
   for (const f of features) {
-    const pts = (f.polyline || []).map(
+    const pts = polylinePoints(f.polyline).map(
       ([x, y]) => new THREE.Vector3(x * metersToUnits, y * metersToUnits, 0.02)
     );
     if (pts.length < 2) continue;
@@ -1,5 +1,6 @@
 import React, { useEffect, useRef } from "react";
 import * as THREE from "three";
+import { polylinePoints } from "../utils/map";
 
 /**
  * StaticVehiclePlot — renders a single snapshot (no RAF loop).
@@ -10,7 +11,7 @@ import * as THREE from "three";
  *    lane_width?: number,
  *    features?: Array<{
  *      kind: "lane" | "road_line" | "boundary_line",
- *      polyline: [number, number][],
+ *      polyline: number[],            // flat [x0, y0, x1, y1, ...]
  *      style?: {
  *        width?: number,               // for lanes
  *        color?: string,               // "#FFFFFF" | "#FFD400"
@@ -259,7 +260,7 @@ function drawRichMap(mapObj, group, metersToUnits) {
   const defaultLaneColor = 0x9aa0a6; // neutral lane hint
 
   for (const f of features) {
-    const pts = (f.polyline || []).map(([x, y]) =>
+    const pts = polylinePoints(f.polyline).map(([x, y]) =>
       new THREE.Vector3(x * metersToUnits, y * metersToUnits, 0.02)
     );
     if (pts.length < 2) continue;
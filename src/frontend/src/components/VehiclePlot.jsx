@@ -1,5 +1,6 @@
 import React, { useEffect, useRef } from "react";
 import * as THREE from "three";
+import { polylinePoints } from "../utils/map";
 
 export default function VehiclePlot({
   vehicles = [],
@@ -315,7 +316,7 @@ function drawRichMap(mapObj, group, metersToUnits) {
   const defaultLaneColor = 0x9aa0a6;
 
   for (const f of features) {
-    const pts = (f.polyline || []).map(([x, y]) =>
+    const pts = polylinePoints(f.polyline).map(([x, y]) =>
       new THREE.Vector3(x * metersToUnits, y * metersToUnits, 0.02)
     );
     if (pts.length < 2) continue;
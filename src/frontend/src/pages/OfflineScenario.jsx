@@ -4,6 +4,7 @@ import "./Offline.css";
 import StaticVehiclePlot from "../components/StaticVehiclePlot";
 import Speedometer from "../components/Speedometer";
 import VehicleTimelinePlot from "../components/VehicleTimeLinePlot";
+import { unpackFrames } from "../utils/frames";
 
 const OfflineScenario = () => {
     const [vehicles, setVehicles] = useState([]);
@@ -28,6 +29,7 @@ const OfflineScenario = () => {
 
     const [pingActive, setPingActive] = useState(false);
     const pingActiveRef = useRef(false);
+    const pushRef = useRef(null);
 
     const setPing = (val) => {
         pingActiveRef.current = val;
@@ -100,6 +102,36 @@ useEffect(() => {
 }, [id]);
 
 
+// Turns executed by other players are pushed here, ping is only a slow fallback
+useEffect(() => {
+    const socket = new WebSocket(
+        `${process.env.REACT_APP_WS_URL}/offline/ws/${id}/${vehicle_id}/`,
+        [localStorage.getItem("token")]
+    );
+    pushRef.current = socket;
+
+    socket.onmessage = (event) => {
+        try {
+            const raw = JSON.parse(event.data);
+            if (raw.turn <= pingTurnRef.current) return;
+
+            pingTurnRef.current = raw.turn;
+            setPing(false);
+            setMoves(raw.next?.moves || []);
+            applyResult(raw.data, raw.tm);
+        } catch (err) {
+            console.error("Push error:", err);
+        }
+    };
+
+    return () => {
+        pushRef.current = null;
+        socket.close();
+    };
+  // eslint-disable-next-line react-hooks/exhaustive-deps
+}, [id, vehicle_id]);
+
+
     const handleChange = (e) => {
         setNewMove({ ...newMove, [e.target.name]: e.target.value });
     };
@@ -143,7 +175,7 @@ useEffect(() => {
         const plt = raw.plt ?? raw;
 
         if (raw.frames) {
-            setPreviewFrames(raw.frames);
+            setPreviewFrames(unpackFrames(raw.frames));
         }
 
         if (plt?.positions) {
@@ -210,8 +242,9 @@ useEffect(() => {
         }
 
         if (raw.frames) {
-            setFrames((prev) => [...prev, ...raw.frames]);
-            framesRef.current = [...framesRef.current, ...raw.frames];
+            const newFrames = unpackFrames(raw.frames);
+            setFrames((prev) => [...prev, ...newFrames]);
+            framesRef.current = [...framesRef.current, ...newFrames];
         }
 
         if (!raw.alive){
@@ -268,7 +301,8 @@ useEffect(() => {
 
         // retry later
         if (pingActiveRef.current) {
-            setTimeout(pollPing, 1000);
+            const pushed = pushRef.current?.readyState === WebSocket.OPEN;
+            setTimeout(pollPing, pushed ? 10000 : 1000);
         }
     };
 
@@ -295,7 +329,7 @@ useEffect(() => {
                     frames={previewFrames}
                     map={map}
                     metersToUnits={1}
-                    followId={"agent0"}
+                    followId={egoAgentIDRef.current || "agent0"}
                     fps={20}
                     loop={true}
                     startPaused={false}
@@ -99,7 +99,7 @@ const Scenario = () => {
 
   useEffect(() => {
     const socket = new WebSocket(
-      `${process.env.REACT_APP_WS_URL}/tasks/ws/${task.id}/${usedVehicle}/`,
+      `${process.env.REACT_APP_WS_URL}/tasks/ws/${task.id}/${usedVehicle}/?lod=1`, // ~25cm map detail is enough for the follow camera
       [localStorage.getItem("token")]
     );
     ws.current = socket;
@@ -0,0 +1,61 @@
+// Offline turns send frames packed (see api/sim/frames.py):
+// { format: "packed", agents, fields, steps, data, humans, goals, interpolate }
+// unpackFrames turns them back into [{ agentId: { position, velocity, heading, goal, is_human } }, ...]
+// and, if the server dropped steps, fills them in by interpolation so playback keeps its timing.
+
+const lerp = (a, b, t) => a + (b - a) * t;
+
+const lerpAngle = (a, b, t) => {
+  const d = Math.atan2(Math.sin(b - a), Math.cos(b - a));
+  return a + d * t;
+};
+
+export function unpackFrames(frames) {
+  if (!frames) return [];
+  if (Array.isArray(frames)) return frames; // already per-frame dicts (e.g. preview)
+  if (frames.format !== "packed") return [];
+
+  const { agents = [], fields = [], steps = [], data = [], humans = [], goals = {} } = frames;
+  const width = agents.length * fields.length;
+  const col = Object.fromEntries(fields.map((f, i) => [f, i]));
+  const humanSet = new Set(humans);
+
+  const row = (f) => data.slice(f * width, (f + 1) * width);
+
+  const toFrame = (values) => {
+    const frame = {};
+    agents.forEach((id, a) => {
+      const v = (name) => values[a * fields.length + col[name]];
+      if (v("x") === null || v("x") === undefined) return;
+      frame[id] = {
+        position: [v("x"), v("y")],
+        velocity: [v("vx"), v("vy")],
+        heading: v("heading"),
+        is_human: humanSet.has(id),
+      };
+      if (goals[id]) frame[id].goal = goals[id];
+    });
+    return frame;
+  };
+
+  const out = [];
+  for (let f = 0; f < steps.length; f++) {
+    const curr = row(f);
+
+    if (frames.interpolate === "linear" && f > 0) {
+      const prev = row(f - 1);
+      const gap = steps[f] - steps[f - 1];
+      for (let s = 1; s < gap; s++) {
+        const t = s / gap;
+        out.push(toFrame(prev.map((p, i) => {
+          const c = curr[i];
+          if (p === null || c === null) return c;
+          return i % fields.length === col.heading ? lerpAngle(p, c, t) : lerp(p, c, t);
+        })));
+      }
+    }
+
+    out.push(toFrame(curr));
+  }
+  return out;
+}
@@ -0,0 +1,12 @@
+// Map polylines are sent as flat float arrays [x0, y0, x1, y1, ...] (see api/cache/maps.py).
+// polylinePoints returns [[x, y], ...] for both the flat and the old nested format.
+export function polylinePoints(polyline) {
+  if (!polyline || !polyline.length) return [];
+  if (Array.isArray(polyline[0])) return polyline;
+
+  const pts = [];
+  for (let i = 0; i + 1 < polyline.length; i += 2) {
+    pts.push([polyline[i], polyline[i + 1]]);
+  }
+  return pts;
+}